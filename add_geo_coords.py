@@ -1,53 +1,211 @@
-import psycopg2
+import argparse
+import csv
+import io
+import json
+import os
 import random
+import time
 
-DB_HOST = 'localhost'
-DB_PORT = 5432
-DB_NAME = 'hospital_db'
-DB_USER = 'postgres'
-DB_PASSWORD = '123456789'
+import pandas as pd
+
+from db import connect
+from id_allocator import normalize_id_column
 
 MIN_LAT, MAX_LAT = 47.5, 47.7
 MIN_LON, MAX_LON = -122.4, -122.2
 
-conn = psycopg2.connect(
-    host=DB_HOST,
-    port=DB_PORT,
-    database=DB_NAME,
-    user=DB_USER,
-    password=DB_PASSWORD,
-    client_encoding='UTF8'
-)
-cur = conn.cursor()
-
-cur.execute("""
-    ALTER TABLE patients ADD COLUMN IF NOT EXISTS latitude NUMERIC(9,6);
-    ALTER TABLE patients ADD COLUMN IF NOT EXISTS longitude NUMERIC(10,6);
-""")
-conn.commit()
-
-cur.execute("SELECT patient_id FROM patients ORDER BY patient_id")
-patients = [row[0] for row in cur.fetchall()]
-
-print(f"Updating coordinates for {len(patients)} patients...")
-
-updated_count = 0
-for patient in patients:
-    lat = round(random.uniform(MIN_LAT, MAX_LAT), 6)
-    lon = round(random.uniform(MIN_LON, MAX_LON), 6)
-    
+CHUNK_SIZE = 10000
+GEOHASH_PRECISION = 9
+CHECKPOINT_FILE = 'geo_progress.json'
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    # Standard geohash: interleave longitude/latitude bisection bits, 5 bits per character
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def read_checkpoint():
+    if os.path.exists(CHECKPOINT_FILE):
+        with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def write_checkpoint(data):
+    # Temp file + rename, so a crash mid-write never leaves a truncated checkpoint
+    tmp_path = CHECKPOINT_FILE + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, CHECKPOINT_FILE)
+
+
+def has_geohash_column(cur):
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'patients' AND column_name = 'geohash'
+    """)
+    return cur.fetchone() is not None
+
+
+def apply_chunk(cur, rows, with_geohash):
+    # COPY the chunk into a temp table, then one UPDATE ... FROM join for the whole chunk
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for patient_id, lat, lon in rows:
+        gh = geohash_encode(lat, lon) if with_geohash else ''
+        writer.writerow((patient_id, lat, lon, gh))
+    buf.seek(0)
+    cur.execute("TRUNCATE geo_stage")
+    cur.copy_expert("COPY geo_stage (patient_id, latitude, longitude, geohash) FROM STDIN WITH (FORMAT csv)", buf)
+    geohash_set = ", geohash = NULLIF(s.geohash, '')" if with_geohash else ""
+    cur.execute(f"""
+        UPDATE patients p
+        SET latitude = s.latitude, longitude = s.longitude{geohash_set}
+        FROM geo_stage s
+        WHERE p.patient_id = s.patient_id
+    """)
+    return cur.rowcount
+
+
+def generated_chunks(cur, chunk_size, start_after, overwrite):
+    # Keyset pagination over patient_id: every chunk is one indexed range read
+    last = start_after
+    missing = "" if overwrite else "AND latitude IS NULL"
+    while True:
+        cur.execute(f"""
+            SELECT patient_id FROM patients
+            WHERE patient_id > %s {missing}
+            ORDER BY patient_id LIMIT %s
+        """, (last, chunk_size))
+        ids = [row[0] for row in cur.fetchall()]
+        if not ids:
+            return
+        yield [(pid, round(random.uniform(MIN_LAT, MAX_LAT), 6), round(random.uniform(MIN_LON, MAX_LON), 6))
+               for pid in ids]
+        last = ids[-1]
+
+
+def imported_chunks(path, chunk_size, skip_chunks):
+    # CSV with patient_id, latitude, longitude columns; the file need not be sorted,
+    # so resuming skips the chunks that were already committed
+    reader = pd.read_csv(path, chunksize=chunk_size, usecols=['patient_id', 'latitude', 'longitude'])
+    for number, chunk in enumerate(reader):
+        if number < skip_chunks:
+            continue
+        chunk['patient_id'] = normalize_id_column(chunk['patient_id'])
+        yield list(chunk[['patient_id', 'latitude', 'longitude']].itertuples(index=False, name=None))
+
+
+def geohash_backfill_chunks(cur, chunk_size):
+    # Rows that already have coordinates but no geohash yet
+    last = ''
+    while True:
+        cur.execute("""
+            SELECT patient_id, latitude, longitude FROM patients
+            WHERE patient_id > %s AND latitude IS NOT NULL AND geohash IS NULL
+            ORDER BY patient_id LIMIT %s
+        """, (last, chunk_size))
+        rows = [(pid, float(lat), float(lon)) for pid, lat, lon in cur.fetchall()]
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+def run(chunks, conn, cur, with_geohash, source, chunks_done=0):
+    updated = 0
+    start = time.perf_counter()
+    for rows in chunks:
+        updated += apply_chunk(cur, rows, with_geohash)
+        conn.commit()
+        # Committed chunk: a rerun with --resume continues after it
+        chunks_done += 1
+        write_checkpoint({'source': source, 'chunks': chunks_done, 'last_patient_id': rows[-1][0]})
+        rate = updated / (time.perf_counter() - start)
+        print(f"  {updated} patients updated (through {rows[-1][0]}, {rate:,.0f} rows/s)")
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Set patient coordinates in bulk")
+    parser.add_argument("--input", help="CSV with patient_id, latitude, longitude to import "
+                                        "(default: generate random coordinates in the Seattle box)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per UPDATE and commit")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="when generating, also replace coordinates that are already set")
+    parser.add_argument("--resume", action="store_true", help="continue after the last committed chunk")
+    parser.add_argument("--geohash", action="store_true",
+                        help="add an indexed geohash column for the map charts; once it exists it is "
+                             "always kept in step with the coordinates")
+    args = parser.parse_args()
+
+    conn = connect()
+    cur = conn.cursor()
+
     cur.execute("""
-        UPDATE patients 
-        SET latitude = %s, longitude = %s 
-        WHERE patient_id = %s
-    """, (lat, lon, patient))
-    
-    if cur.rowcount > 0:
-        updated_count += 1
-        print(f"Updated {patient}: lat={lat}, lon={lon}")
-
-conn.commit()
-print(f"Updated {updated_count} records. Refresh in Superset Datasets > patients.")
-
-cur.close()
-conn.close()
\ No newline at end of file
+        ALTER TABLE patients ADD COLUMN IF NOT EXISTS latitude NUMERIC(9,6);
+        ALTER TABLE patients ADD COLUMN IF NOT EXISTS longitude NUMERIC(10,6);
+    """)
+    if args.geohash:
+        # Cells are geohash prefixes, so a prefix LIKE 'c23n%' is an index range scan
+        cur.execute(f"""
+            ALTER TABLE patients ADD COLUMN IF NOT EXISTS geohash VARCHAR({GEOHASH_PRECISION});
+            CREATE INDEX IF NOT EXISTS idx_patients_geohash ON patients (geohash varchar_pattern_ops);
+        """)
+    # An existing geohash column is updated together with the coordinates even without
+    # --geohash, otherwise it would keep the cells of the old coordinates
+    with_geohash = args.geohash or has_geohash_column(cur)
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS geo_stage "
+                "(patient_id TEXT PRIMARY KEY, latitude NUMERIC(9,6), longitude NUMERIC(10,6), geohash TEXT)")
+    conn.commit()
+
+    source = args.input or 'generated'
+    checkpoint = read_checkpoint() if args.resume else {}
+    if checkpoint.get('source') != source:
+        checkpoint = {'chunks': 0, 'last_patient_id': ''}
+    elif checkpoint['chunks']:
+        print(f"Resuming after chunk {checkpoint['chunks']} ({checkpoint['last_patient_id']})")
+
+    if args.input:
+        print(f"Importing coordinates from {args.input}...")
+        chunks = imported_chunks(args.input, args.chunk_size, checkpoint['chunks'])
+    else:
+        # Without --overwrite only patients with no coordinates are read, so a plain rerun
+        # also picks up where an interrupted run stopped
+        print("Generating coordinates...")
+        chunks = generated_chunks(conn.cursor(), args.chunk_size, checkpoint['last_patient_id'], args.overwrite)
+    updated = run(chunks, conn, cur, with_geohash, source, checkpoint['chunks'])
+
+    if with_geohash:
+        print("Filling geohash for patients that already had coordinates...")
+        updated += run(geohash_backfill_chunks(conn.cursor(), args.chunk_size), conn, cur, True, 'geohash')
+
+    if os.path.exists(CHECKPOINT_FILE):
+        os.remove(CHECKPOINT_FILE)
+    print(f"Updated {updated} records. Refresh in Superset Datasets > patients.")
+
+    cur.close()
+    conn.close()
@@ -1,14 +1,9 @@
-import psycopg2
 import random
 import time
 from faker import Faker  
 
-# Database connection parameters (replace with yours)
-DB_HOST = 'localhost'
-DB_PORT = 5432
-DB_NAME = 'hospital_db'
-DB_USER = 'postgres'  # Your username
-DB_PASSWORD = '123456789'  # Your password
+from db import connect
+from id_allocator import IdAllocator
 
 # Initialize Faker for random data
 fake = Faker()
@@ -17,26 +12,18 @@ fake = Faker()
 specializations = ['Dermatology', 'Pediatrics', 'Oncology']
 hospital_branches = ['Central Hospital', 'Eastside Clinic', 'Westside Clinic']
 
-# Connect with explicit UTF-8 encoding
-conn = psycopg2.connect(
-    host=DB_HOST,
-    port=DB_PORT,
-    database=DB_NAME,
-    user=DB_USER,
-    password=DB_PASSWORD,
-    client_encoding='UTF8'
-)
+# Connection settings come from db.py (db_config.json or HOSPITAL_DB_* variables)
+conn = connect()
 cur = conn.cursor()
 
-# Get next ID (after D010; adjust if needed)
-cur.execute("SELECT COALESCE(MAX(CAST(SUBSTRING(doctor_id FROM 2) AS INTEGER)), 10) FROM doctors")
-next_num = cur.fetchone()[0] + 1
+# Ids come from the doctors_id_seq sequence, so several copies of this script can run at once
+ids = IdAllocator(conn, 'doctors')
 
 print("Script started. Inserting new doctors every 10 seconds. Stop with Ctrl+C.")
 
 try:
     while True:
-        next_id = f"D{next_num:03d}"
+        next_id = ids.next_id()
         first_name = fake.first_name()
         last_name = fake.last_name()
         specialization = random.choice(specializations)
@@ -56,7 +43,6 @@ try:
         
         print(f"Inserted: {next_id} ({first_name} {last_name}, {specialization}, {years_experience} years, {hospital_branch})")
         
-        next_num += 1
         time.sleep(2)  # Interval: 10 seconds (as in Task 2)
         
 except KeyboardInterrupt:
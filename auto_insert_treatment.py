@@ -1,15 +1,10 @@
-import psycopg2
 import random
 import time
 from faker import Faker  # For generating fake medical phrases (install: pip install faker)
 
-# Database connection parameters (replace with yours)
-DB_HOST = 'localhost'
-DB_PORT = 5432
-DB_NAME = 'hospital_db'
-DB_USER = 'postgres'  # Your username
-DB_PASSWORD = '123456789'  # Your password
-client_encoding='UTF8'
+from db import connect
+from id_allocator import IdAllocator
+from key_pool import KeyPool
 
 # Initialize Faker
 fake = Faker()
@@ -45,30 +40,22 @@ descriptions_base = [  # 20+ unique meaningful phrases (expandable)
 ]
 
 # Connect
-conn = psycopg2.connect(
-    host=DB_HOST,
-    port=DB_PORT,
-    database=DB_NAME,
-    user=DB_USER,
-    password=DB_PASSWORD,
-    client_encoding='UTF8'
-)
+conn = connect()
 cur = conn.cursor()
 
-# Fetch existing appointment_ids (to respect FK)
-cur.execute("SELECT appointment_id FROM appointments ORDER BY appointment_id")
-appointments = [row[0] for row in cur.fetchall()]
+# Existing appointment_ids (to respect FK); new appointments are picked up each round
+appointments = KeyPool('appointments').load(conn)
 
-# Get next treatment_id (after T200)
-cur.execute("SELECT COALESCE(MAX(CAST(SUBSTRING(treatment_id FROM 2) AS INTEGER)), 200) FROM treatments")
-next_num = cur.fetchone()[0] + 1
+# Ids come from the treatments_id_seq sequence, so several copies of this script can run at once
+ids = IdAllocator(conn, 'treatments')
 
 print("Script started. Inserting new treatments with varied descriptions every 10 seconds. Stop with Ctrl+C.")
 
 try:
     while True:
-        next_id = f"T{next_num:03d}"
-        appointment = random.choice(appointments)  # Link to existing appointment
+        appointments.refresh(conn)
+        next_id = ids.next_id()
+        appointment = appointments.sample()  # Link to existing appointment
         treatment_type = random.choice(treatment_types)
         # Random description from list (varied, meaningful)
         description = random.choice(descriptions_base)
@@ -87,7 +74,6 @@ try:
         
         print(f"Inserted: {next_id} ({treatment_type}, '{description}', Cost: ${cost}, Date: {treatment_date})")
         
-        next_num += 1
         time.sleep(2)  # Interval: 10 seconds
         
 except KeyboardInterrupt:
@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from data_scaler import scale_data
+
+# Benchmarks the analytics workload at several data sizes against a local PostgreSQL.
+#
+# For every scale factor the base CSVs are scaled with data_scaler.py and loaded into a
+# separate database (hospital_bench by default, so hospital_db is never touched). That
+# database is dropped and created again before each load, so every scale starts from an
+# empty schema. The stages are timed one by one:
+#   load     load_to_postgres.py --data-dir, run as its own process
+#   queries  every query in queries.sql, one at a time (main.run_pack with one worker)
+#   charts   every chart in visual_query.sql without the result cache (graph.run_pipeline)
+#   export   the billing report with the detail sheet (interactive_graph's queries) as Excel
+#
+# Results go to bench_results/bench_<timestamp>.json with the git commit, so runs of
+# different commits can be put side by side with `python benchmark.py compare a.json b.json`.
+
+# Scale 5000 = 1M appointments, treatments and bills
+DEFAULT_SCALES = [1, 100, 5000]
+STAGES = ['load', 'queries', 'charts', 'export']
+# Timings that differ by less than this are reported as unchanged by compare
+NOISE = 0.05
+# Never dropped, whatever --database says
+PROTECTED_DATABASES = {'postgres', 'template0', 'template1', 'hospital_db'}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def recreate_database(name):
+    import psycopg2
+    from db import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, connect_kwargs
+
+    conn = psycopg2.connect(host=DB_HOST, port=DB_PORT, dbname='postgres', user=DB_USER, password=DB_PASSWORD,
+                            **connect_kwargs())
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            # FORCE (PostgreSQL 13+) ends the pooled connections left by the previous scale;
+            # the engines reconnect through pool_pre_ping
+            cur.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+            cur.execute(f'CREATE DATABASE "{name}"')
+    finally:
+        conn.close()
+
+
+def bench_load(data_dir, mode, workers):
+    command = [sys.executable, "load_to_postgres.py", "--mode", mode, "--data-dir", data_dir]
+    if workers > 1:
+        command += ["--workers", str(workers)]
+    start = time.perf_counter()
+    done = subprocess.run(command, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    # The loader reports per-table failures on stdout and carries on
+    failed = [line for line in done.stdout.splitlines() if line.startswith("Error")]
+    if done.returncode != 0 or failed:
+        print(done.stdout[-2000:] + done.stderr[-2000:])
+    return {"seconds": seconds, "ok": done.returncode == 0 and not failed}
+
+
+def analyze():
+    from db import connect
+
+    conn = connect()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE")
+    finally:
+        conn.close()
+
+
+def bench_queries(path):
+    from main import run_pack
+    from query_pack import read_queries
+
+    results = run_pack(read_queries(path), workers=1, show_rows=1)
+    return {r["name"]: {"ms": r["wall_ms"], "rows": r["rows"], "error": r["error"]} for r in results}
+
+
+def bench_charts(specs_path, out_dir, render_workers):
+    from chart_specs import load_chart_specs
+    from db import get_engine
+    from graph import run_pipeline
+
+    os.makedirs(out_dir, exist_ok=True)
+    specs = load_chart_specs(specs_path)
+    timings = run_pipeline(specs, get_engine(), None, 1, render_workers, out_dir)
+    return {name: {"query_ms": t["query_ms"], "render_ms": t["render_ms"], "status": t["status"]}
+            for name, t in timings.items()}
+
+
+def bench_export(out_dir):
+    from db import get_engine
+    from excel_export import stream_query, write_workbook
+    from interactive_graph import detail_sql, summary_sql
+
+    # Every bill, whatever the replicas' date shifts
+    params = {'start': '1900-01-01', 'end': '2100-01-01'}
+    engine = get_engine()
+    stats = write_workbook(os.path.join(out_dir, "billing_report.xlsx"), {
+        "Billing_Summary": stream_query(engine, summary_sql, params),
+        "Billing_Detail": stream_query(engine, detail_sql, params),
+    })
+    seconds = stats["seconds"]
+    # peak_bytes is the peak of the whole benchmark process so far, not of the export alone
+    return {"rows": stats["rows"], "seconds": seconds, "rows_per_s": stats["rows"] / seconds if seconds else None,
+            "peak_bytes": stats["peak_bytes"]}
+
+
+def run_scale(scale, args):
+    data_dir = os.path.join(args.data_dir, f"sf{scale}")
+    start = time.perf_counter()
+    rows = scale_data(scale, data_dir, args.base, args.seed)
+    result = {"scale": scale, "rows": rows, "scale_seconds": time.perf_counter() - start}
+    print(f"\n=== Scale {scale}: {sum(rows.values())} rows ===")
+
+    recreate_database(args.database)
+    result["load"] = bench_load(data_dir, args.mode, args.workers)
+    print(f"load: {result['load']['seconds']:.2f}s")
+    if not result["load"]["ok"]:
+        # Timing queries against a half-loaded database would only be misleading
+        print(f"Load failed at scale {scale}, skipping the other stages")
+        return result
+    analyze()
+
+    work_dir = os.path.join(args.out, f"sf{scale}")
+    if 'queries' not in args.skip:
+        result["queries"] = bench_queries(args.queries)
+        print(f"queries: {sum(q['ms'] or 0 for q in result['queries'].values()):.1f} ms total")
+    if 'charts' not in args.skip:
+        result["charts"] = bench_charts(args.specs, os.path.join(work_dir, "charts"), args.render_workers)
+        print(f"charts: {sum(c['query_ms'] + c['render_ms'] for c in result['charts'].values()):.1f} ms total")
+    if 'export' not in args.skip:
+        result["export"] = bench_export(work_dir)
+    return result
+
+
+def timings(run):
+    # Flat {(scale, metric): ms} view of a results file, as used by compare
+    flat = {}
+    for s in run["scales"]:
+        scale = s["scale"]
+        if "load" in s:
+            flat[(scale, "load")] = s["load"]["seconds"] * 1000
+        for name, q in s.get("queries", {}).items():
+            if q["ms"] is not None:
+                flat[(scale, f"query: {name}")] = q["ms"]
+        for name, c in s.get("charts", {}).items():
+            flat[(scale, f"chart: {name}")] = c["query_ms"] + c["render_ms"]
+        if "export" in s:
+            flat[(scale, "export")] = s["export"]["seconds"] * 1000
+    return flat
+
+
+def compare(old_path, new_path):
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"old: {old_path} ({old.get('git_commit')}), new: {new_path} ({new.get('git_commit')})")
+    old_ms, new_ms = timings(old), timings(new)
+    print(f"{'scale':>6}  {'metric':<60} {'old ms':>10} {'new ms':>10} {'change':>8}")
+    for key in sorted(set(old_ms) & set(new_ms)):
+        before, after = old_ms[key], new_ms[key]
+        change = (after - before) / before if before else 0.0
+        flag = "" if abs(change) < NOISE else ("  slower" if change > 0 else "  faster")
+        print(f"{key[0]:>6}  {key[1][:60]:<60} {before:>10.1f} {after:>10.1f} {change:>+8.1%}{flag}")
+    only = sorted(set(old_ms) ^ set(new_ms))
+    if only:
+        print(f"{len(only)} timings are only in one of the files and were not compared")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark loader, queries, charts and export at several data sizes")
+    parser.add_argument("command", nargs="?", choices=["run", "compare"], default="run")
+    parser.add_argument("files", nargs="*", help="with compare: old and new results file")
+    parser.add_argument("--scale", type=int, action="append",
+                        help=f"scale factor, repeatable (default: {' '.join(map(str, DEFAULT_SCALES))})")
+    parser.add_argument("--seed", type=int, default=42, help="seed for the data scaler")
+    parser.add_argument("--database", default="hospital_bench",
+                        help="database the scaled data is loaded into; it is dropped and recreated for every scale")
+    parser.add_argument("--base", default="data", help="directory with the base CSVs")
+    parser.add_argument("--data-dir", default="bench_data", help="where scaled CSVs are written and reused")
+    parser.add_argument("--out", default="bench_results", help="where results, charts and reports are written")
+    parser.add_argument("--mode", choices=["replace", "copy"], default="copy", help="loader mode")
+    parser.add_argument("--workers", type=int, default=1, help="loader workers")
+    parser.add_argument("--render-workers", type=int, default=os.cpu_count() or 2,
+                        help="processes drawing charts")
+    parser.add_argument("--queries", default="queries.sql", help="query pack to time")
+    parser.add_argument("--specs", default="visual_query.sql", help="chart definitions to time")
+    parser.add_argument("--skip", action="append", default=[], choices=STAGES[1:],
+                        help="leave out a stage, repeatable")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        if len(args.files) != 2:
+            parser.error("compare needs two results files")
+        compare(*args.files)
+        raise SystemExit(0)
+
+    # db.py reads its settings on import, so the database has to be chosen before anything imports it;
+    # the loader subprocess inherits it the same way
+    if args.database in PROTECTED_DATABASES:
+        parser.error(f"--database {args.database} would be dropped; use a database just for benchmarks")
+    os.environ["HOSPITAL_DB_DBNAME"] = args.database
+    import psycopg2
+
+    run = {"run_at": datetime.now().isoformat(timespec="seconds"), "git_commit": git_commit(),
+           "database": args.database, "seed": args.seed, "mode": args.mode, "workers": args.workers, "scales": []}
+    try:
+        for scale in args.scale or DEFAULT_SCALES:
+            run["scales"].append(run_scale(scale, args))
+    except psycopg2.OperationalError as e:
+        raise SystemExit(f"Could not connect to the database: {e}")
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=2)
+    print(f"\nResults written to {path}")
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+# On-disk cache of chart query results.
+# A result is keyed by the normalized SQL plus a version token of every table the SQL
+# mentions. The token comes from pg_stat_user_tables (insert/update/delete counters) and
+# pg_class (relfilenode changes on TRUNCATE or a table rebuild), so any write to a source
+# table produces a new key. Results are stored as Parquet; the least recently used
+# entries are evicted once the directory grows past max_bytes.
+# Note: the statistics collector publishes counters when a transaction ends, so a
+# write committed in the last few hundred milliseconds may not be visible yet.
+
+CACHE_DIR = ".chart_cache"
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+INDEX_FILE = "index.json"
+
+
+def normalize_sql(sql):
+    sql = re.sub(r"--[^\n]*", " ", sql)
+    sql = re.sub(r"/\*.*?\*/", " ", sql, flags=re.S)
+    return re.sub(r"\s+", " ", sql).strip().rstrip(";").strip()
+
+
+class ChartCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        self.index = {"entries": {}, "charts": {}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def table_versions(connection):
+        rows = connection.execute(text("""
+            SELECT s.relname, c.relfilenode, s.n_tup_ins, s.n_tup_upd, s.n_tup_del
+            FROM pg_stat_user_tables s
+            JOIN pg_class c ON c.oid = s.relid
+        """))
+        return {row.relname: f"{row.relfilenode}:{row.n_tup_ins}:{row.n_tup_upd}:{row.n_tup_del}" for row in rows}
+
+    @staticmethod
+    def key_for(sql, versions):
+        sql = normalize_sql(sql)
+        words = set(re.findall(r"[a-z_][a-z0-9_]*", sql.lower()))
+        token = ";".join(f"{t}={versions[t]}" for t in sorted(words & versions.keys()))
+        return hashlib.sha256(f"{sql}\n{token}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def chart_key(data_key, spec):
+        # A chart is current only if both its data and its presentation are unchanged
+        parts = [data_key] + [str(getattr(spec, k, "")) for k in ("type", "title", "xlabel", "ylabel")]
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, key):
+        entry = self.index["entries"].get(key)
+        if entry is None or not os.path.exists(self._path(key)):
+            self.misses += 1
+            return None
+        entry["last_used"] = time.time()
+        self.hits += 1
+        return pd.read_parquet(self._path(key))
+
+    def put(self, key, df, name=""):
+        path = self._path(key)
+        df.to_parquet(path, index=False)
+        self.index["entries"][key] = {"name": name, "size": os.path.getsize(path), "last_used": time.time()}
+        self._evict()
+
+    def chart_is_current(self, name, chart_key, chart_file):
+        return self.index["charts"].get(name) == chart_key and os.path.exists(chart_file)
+
+    def mark_chart(self, name, chart_key):
+        self.index["charts"][name] = chart_key
+
+    def _evict(self):
+        entries = self.index["entries"]
+        total = sum(e["size"] for e in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            total -= entries[key]["size"]
+            del entries[key]
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+
+    def save(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
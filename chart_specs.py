@@ -0,0 +1,151 @@
+import json
+import os
+import re
+from dataclasses import dataclass, asdict
+
+# Loader for the visual_query.sql chart DSL:
+#
+#   -- name: bar_top_doctors_revenue
+#   -- type: bar
+#   -- title: Top 10 Doctors by Total Revenue in 2023
+#   -- xlabel: Doctor
+#   -- ylabel: Total Revenue
+#   SELECT ...;
+#
+# Header values run to the end of the line, so titles may contain colons. The whole file
+# is checked before anything touches the database, and the parsed specs are cached as
+# JSON next to the chart result cache until the source file's mtime or size changes.
+
+SPEC_CACHE_DIR = ".chart_cache"
+
+# Labels each chart type needs; title is always required
+REQUIRED_LABELS = {
+    "pie": [],
+    "bar": ["xlabel", "ylabel"],
+    "barh": ["xlabel", "ylabel"],
+    "line": ["xlabel", "ylabel"],
+    "hist": ["xlabel", "ylabel"],
+    "scatter": ["xlabel", "ylabel"],
+}
+HEADER_KEYS = {"name", "type", "title", "xlabel", "ylabel"}
+HEADER_RE = re.compile(r"^--\s*(\w+)\s*:(.*)$")
+NAME_RE = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+@dataclass
+class ChartSpec:
+    name: str
+    type: str
+    title: str
+    xlabel: str
+    ylabel: str
+    sql: str
+    line: int  # line of the "-- name:" header in the source file
+
+
+class ChartSpecError(ValueError):
+    def __init__(self, path, problems):
+        self.path = path
+        self.problems = problems
+        super().__init__(f"{path}: {len(problems)} problem(s)\n" + "\n".join(f"  {p}" for p in problems))
+
+
+def parse_chart_specs(content, path="visual_query.sql"):
+    specs = []
+    problems = []
+    current = None
+
+    def finish(block):
+        if block is None:
+            return
+        block["sql"] = "\n".join(block["sql"]).strip().rstrip(";").strip()
+        specs.append(block)
+
+    for lineno, line in enumerate(content.splitlines(), start=1):
+        header = HEADER_RE.match(line.strip())
+        if header and header.group(1) == "name":
+            finish(current)
+            current = {"name": header.group(2).strip(), "line": lineno, "sql": []}
+        elif current is None:
+            if line.strip() and not line.strip().startswith("--"):
+                problems.append(f"line {lineno}: SQL outside of a '-- name:' block")
+        elif header and not current["sql"]:
+            key = header.group(1)
+            if key not in HEADER_KEYS:
+                problems.append(f"line {lineno}: unknown header '{key}' in '{current['name']}'")
+            elif key in current:
+                problems.append(f"line {lineno}: duplicate header '{key}' in '{current['name']}'")
+            else:
+                current[key] = header.group(2).strip()
+        elif not line.strip().startswith("--"):
+            current["sql"].append(line)
+    finish(current)
+
+    seen = {}
+    result = []
+    for block in specs:
+        where = f"line {block['line']} ('{block['name']}')"
+        if not NAME_RE.match(block["name"]):
+            problems.append(f"{where}: name must be letters, digits, '_' or '-'")
+        if block["name"] in seen:
+            problems.append(f"{where}: name already used on line {seen[block['name']]}")
+        seen[block["name"]] = block["line"]
+        chart_type = block.get("type", "")
+        if chart_type not in REQUIRED_LABELS:
+            problems.append(f"{where}: unknown type '{chart_type}', expected one of {sorted(REQUIRED_LABELS)}")
+        for key in ["title"] + REQUIRED_LABELS.get(chart_type, []):
+            if not block.get(key):
+                problems.append(f"{where}: missing '{key}'")
+        if not block["sql"]:
+            problems.append(f"{where}: no SQL")
+        result.append(ChartSpec(name=block["name"], type=chart_type, title=block.get("title", ""),
+                                xlabel=block.get("xlabel", ""), ylabel=block.get("ylabel", ""),
+                                sql=block["sql"], line=block["line"]))
+
+    if problems:
+        raise ChartSpecError(path, problems)
+    return result
+
+
+def _cache_path(path, cache_dir):
+    return os.path.join(cache_dir, "specs", os.path.basename(path) + ".json")
+
+
+def load_chart_specs(path="visual_query.sql", cache_dir=SPEC_CACHE_DIR):
+    stat = os.stat(path)
+    stamp = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    cache_path = _cache_path(path, cache_dir)
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("source") == stamp:
+                return [ChartSpec(**s) for s in cached["specs"]]
+        except (ValueError, TypeError, KeyError):
+            pass  # unreadable or outdated cache format: parse again
+
+    with open(path, "r", encoding="utf-8") as f:
+        specs = parse_chart_specs(f.read(), path)
+
+    # Only valid files are cached, so a broken file is re-checked on every run
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"source": stamp, "specs": [asdict(s) for s in specs]}, f)
+    os.replace(tmp_path, cache_path)
+    return specs
+
+
+def check_sql(specs, connection, path="visual_query.sql"):
+    # Plain EXPLAIN plans each query without running it, which catches syntax errors and
+    # unknown tables/columns before any chart query is executed
+    problems = []
+    for spec in specs:
+        try:
+            with connection.begin():
+                connection.exec_driver_sql("EXPLAIN " + spec.sql)
+        except Exception as e:
+            message = str(getattr(e, "orig", e)).strip().splitlines()[0]
+            problems.append(f"line {spec.line} ('{spec.name}'): {message}")
+    if problems:
+        raise ChartSpecError(path, problems)
@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import random
+
+import numpy as np
+import pandas as pd
+
+from id_allocator import ID_TABLES, ID_WIDTH, normalize_id_column
+
+# Deterministic scale-up of the sample CSVs in data/ for benchmarks.
+#
+# Scale factor k writes k replicas of the patients, appointments, treatments and
+# billing rows. Replica r renumbers every key to r * stride + n, where n is its number
+# in the base data, and points its foreign keys at rows of the same replica. Every key
+# therefore exists and the per-parent shape of the base data is unchanged, e.g.
+# appointments per patient and bills per treatment. Replica 0 is the base data itself,
+# so scale factor 1 reproduces the source CSVs. Every other replica moves its dates
+# by a fixed number of days and scales its amounts by a fixed factor, both derived
+# from (seed, r). That spreads the rows over several years and price levels without
+# breaking the base data's date order (appointment <= treatment <= bill).
+#
+# Doctors grow more slowly (about sqrt(k) replicas), and replica r of the appointments
+# is served by doctor replica r % doctor_replicas.
+
+LOAD_ORDER = ['patients', 'doctors', 'appointments', 'treatments', 'billing']
+# table -> {column: referenced table}
+FOREIGN_KEYS = {
+    'appointments': {'patient_id': 'patients', 'doctor_id': 'doctors'},
+    'treatments': {'appointment_id': 'appointments'},
+    'billing': {'patient_id': 'patients', 'treatment_id': 'treatments'},
+}
+CSV_RENAMES = {
+    'treatments': {'appointmentID': 'appointment_id'},
+    'billing': {'patientID': 'patient_id', 'treatmentID': 'treatment_id'},
+}
+DATE_COLUMNS = {
+    'patients': ['date_of_birth', 'registration_date'],
+    'appointments': ['appointment_date'],
+    'treatments': ['treatment_date'],
+    'billing': ['bill_date'],
+}
+MONEY_COLUMNS = {'treatments': ['cost'], 'billing': ['amount']}
+MAX_DAY_SHIFT = 3 * 365
+# Rows generated and written per step, which bounds memory
+ROWS_PER_WRITE = 200000
+MANIFEST = 'scale.json'
+# Stored in the manifest; bump it when the generated rows change, so old outputs are rebuilt
+FORMAT_VERSION = 2
+
+
+def doctor_replicas(scale):
+    return max(1, round(scale ** 0.5))
+
+
+def replica_params(seed, replica):
+    # (day shift, amount factor); replica 0 stays as it is
+    if replica == 0:
+        return 0, 1.0
+    rng = random.Random(f"{seed}:{replica}")
+    return rng.randint(-MAX_DAY_SHIFT, MAX_DAY_SHIFT), rng.uniform(0.8, 1.25)
+
+
+def read_base(data_dir):
+    base = {}
+    for table in LOAD_ORDER:
+        df = pd.read_csv(os.path.join(data_dir, f"{table}.csv"), dtype=str, keep_default_na=False)
+        df = df.rename(columns=CSV_RENAMES.get(table, {}))
+        key_column = ID_TABLES[table][0]
+        for column in [key_column] + list(FOREIGN_KEYS.get(table, {})):
+            df[column] = normalize_id_column(df[column])
+        base[table] = df
+    return base
+
+
+def key_numbers(series):
+    return series.str[1:].astype('int64').to_numpy()
+
+
+def stride_for(base):
+    # Smallest power of ten above every base key number, so replicas never overlap
+    highest = max(int(key_numbers(df[ID_TABLES[t][0]]).max()) for t, df in base.items())
+    return 10 ** len(str(highest))
+
+
+def renumber(numbers, prefix):
+    return prefix + pd.Series(numbers).astype(str).str.zfill(ID_WIDTH)
+
+
+def replica_frame(table, df, replicas, stride, scale, seed):
+    # All rows of the given replicas at once: the base rows repeated len(replicas) times
+    n = len(df)
+    per_row = np.repeat(replicas, n)
+    out = pd.DataFrame({column: np.tile(df[column].to_numpy(), len(replicas)) for column in df.columns})
+    key_column, prefix = ID_TABLES[table]
+    out[key_column] = renumber(np.tile(key_numbers(df[key_column]), len(replicas)) + per_row * stride, prefix)
+    for column, parent in FOREIGN_KEYS.get(table, {}).items():
+        parent_replicas = per_row % doctor_replicas(scale) if parent == 'doctors' else per_row
+        numbers = np.tile(key_numbers(df[column]), len(replicas)) + parent_replicas * stride
+        out[column] = renumber(numbers, ID_TABLES[parent][1])
+    params = [replica_params(seed, r) for r in replicas]
+    day_shift = np.repeat([p[0] for p in params], n)
+    amount_factor = np.repeat([p[1] for p in params], n)
+    for column in DATE_COLUMNS.get(table, []):
+        dates = pd.to_datetime(pd.Series(np.tile(df[column].to_numpy(), len(replicas))), errors='coerce')
+        dates = dates + pd.to_timedelta(day_shift, unit='D')
+        out[column] = dates.dt.strftime('%Y-%m-%d').fillna('')
+    for column in MONEY_COLUMNS.get(table, []):
+        amounts = pd.to_numeric(pd.Series(np.tile(df[column].to_numpy(), len(replicas))), errors='coerce')
+        amounts = (amounts * amount_factor).round(2)
+        out[column] = amounts.map(lambda v: '' if pd.isna(v) else f"{v:.2f}")
+    return out
+
+
+def scale_data(scale, out_dir, base_dir='data', seed=42):
+    # Writes <out_dir>/<table>.csv; an existing output for the same scale and seed is reused
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if (manifest.get('scale'), manifest.get('seed'), manifest.get('version')) == (scale, seed, FORMAT_VERSION):
+            return manifest['rows']
+
+    base = read_base(base_dir)
+    stride = stride_for(base)
+    os.makedirs(out_dir, exist_ok=True)
+    rows = {}
+    for table in LOAD_ORDER:
+        replicas = doctor_replicas(scale) if table == 'doctors' else scale
+        path = os.path.join(out_dir, f"{table}.csv")
+        step = max(1, ROWS_PER_WRITE // max(len(base[table]), 1))
+        rows[table] = 0
+        for first in range(0, replicas, step):
+            group = np.arange(first, min(first + step, replicas))
+            frame = replica_frame(table, base[table], group, stride, scale, seed)
+            frame.to_csv(path, mode='w' if first == 0 else 'a', header=first == 0, index=False)
+            rows[table] += len(frame)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({'scale': scale, 'seed': seed, 'version': FORMAT_VERSION, 'rows': rows}, f, indent=2)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a scaled copy of data/*.csv with valid foreign keys")
+    parser.add_argument("scale", type=int, help="replicas of the base data (1 = unchanged size)")
+    parser.add_argument("--out", help="output directory (default: bench_data/sf<scale>)")
+    parser.add_argument("--base", default="data", help="directory with the base CSVs")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    out_dir = args.out or os.path.join("bench_data", f"sf{args.scale}")
+    rows = scale_data(args.scale, out_dir, args.base, args.seed)
+    print(f"Wrote {out_dir}: " + ", ".join(f"{t} {n}" for t, n in rows.items()))
@@ -0,0 +1,262 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
+
+# Shared database settings and connections for every script.
+#
+# Settings come from DEFAULTS, then db_config.json (or the file named by
+# HOSPITAL_DB_CONFIG), then HOSPITAL_DB_<SETTING> environment variables, e.g.
+# HOSPITAL_DB_HOST=db.internal HOSPITAL_DB_STATEMENT_TIMEOUT_MS=30000 python main.py
+#
+# All connections, psycopg2 or SQLAlchemy, use InstrumentedCursor, so every execute,
+# executemany, COPY and fetch is reported to the functions registered with add_query_hook().
+# Setting metrics_file or slow_query_ms turns on query_metrics.py for the whole process.
+
+DEFAULTS = {
+    'host': 'localhost',
+    'port': 5432,
+    'dbname': 'hospital_db',
+    'user': 'postgres',
+    'password': '123456789',
+    'pool_size': 5,
+    'max_overflow': 5,
+    # 0 = no limit; loads and migrations can legitimately run for a long time
+    'statement_timeout_ms': 0,
+    'application_name': 'hospital-analytics',
+    # Latency histograms etc. written at exit; .json or Prometheus text, {script} = script name
+    'metrics_file': '',
+    # Statements slower than this get their EXPLAIN plan logged; 0 = off
+    'slow_query_ms': 0,
+    'slow_query_log': 'exports/slow_queries.jsonl',
+}
+INT_SETTINGS = {'port', 'pool_size', 'max_overflow', 'statement_timeout_ms', 'slow_query_ms'}
+ENV_PREFIX = 'HOSPITAL_DB_'
+CONFIG_FILE = os.environ.get(ENV_PREFIX + 'CONFIG', 'db_config.json')
+
+# Rows per round trip for server-side cursors
+FETCH_SIZE = 20000
+# Rows sampled per fetched batch to estimate its size in bytes
+BYTES_SAMPLE_ROWS = 100
+
+
+def load_settings(path=CONFIG_FILE):
+    settings = dict(DEFAULTS)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            from_file = json.load(f)
+        unknown = sorted(set(from_file) - set(DEFAULTS))
+        if unknown:
+            raise ValueError(f"{path}: unknown settings {unknown}, expected some of {sorted(DEFAULTS)}")
+        settings.update(from_file)
+    for key in DEFAULTS:
+        value = os.environ.get(ENV_PREFIX + key.upper())
+        if value is not None:
+            settings[key] = value
+    for key in INT_SETTINGS:
+        settings[key] = int(settings[key])
+    return settings
+
+
+SETTINGS = load_settings()
+DB_HOST = SETTINGS['host']
+DB_PORT = SETTINGS['port']
+DB_NAME = SETTINGS['dbname']
+DB_USER = SETTINGS['user']
+DB_PASSWORD = SETTINGS['password']
+
+QUERY_HOOKS = []
+
+
+def add_query_hook(hook):
+    # hook(event) with event keys: kind ('execute', 'executemany', 'copy', 'fetch'), sql,
+    # params, seconds, rows (-1 when unknown), bytes (fetch only, estimated), error
+    # (exception or None), cursor
+    QUERY_HOOKS.append(hook)
+    return hook
+
+
+def remove_query_hook(hook):
+    if hook in QUERY_HOOKS:
+        QUERY_HOOKS.remove(hook)
+
+
+def query_text(query):
+    if isinstance(query, bytes):
+        return query.decode('utf-8', 'replace')
+    return query if isinstance(query, str) else str(query)
+
+
+def estimate_bytes(rows):
+    # Text/bytea values by length, everything else as 8 bytes; large batches are sampled
+    if not rows:
+        return 0
+    sample = rows[:BYTES_SAMPLE_ROWS]
+    size = 0
+    for row in sample:
+        for value in row:
+            size += len(value) if isinstance(value, (str, bytes, memoryview)) else 8
+    return size * len(rows) // len(sample)
+
+
+def notify(event):
+    for hook in list(QUERY_HOOKS):
+        try:
+            hook(event)
+        except Exception as e:
+            # A broken hook must never fail the query it observes
+            print(f"Query hook {getattr(hook, '__name__', hook)} failed: {e}")
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    last_sql = None
+
+    def _timed(self, kind, query, params, call):
+        if not QUERY_HOOKS:
+            return call()
+        self.last_sql = query_text(query)
+        start = time.perf_counter()
+        error = None
+        try:
+            return call()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            notify({'kind': kind, 'sql': self.last_sql, 'params': params, 'seconds': time.perf_counter() - start,
+                    'rows': self.rowcount, 'bytes': None, 'error': error, 'cursor': self})
+
+    def _fetched(self, rows, start):
+        notify({'kind': 'fetch', 'sql': self.last_sql, 'params': None, 'seconds': time.perf_counter() - start,
+                'rows': len(rows), 'bytes': estimate_bytes(rows), 'error': None, 'cursor': self})
+
+    def execute(self, query, vars=None):
+        return self._timed('execute', query, vars, lambda: super(InstrumentedCursor, self).execute(query, vars))
+
+    def executemany(self, query, vars_list):
+        return self._timed('executemany', query, None,
+                           lambda: super(InstrumentedCursor, self).executemany(query, vars_list))
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed('copy', sql, None,
+                           lambda: super(InstrumentedCursor, self).copy_expert(sql, file, size))
+
+    def fetchone(self):
+        if not QUERY_HOOKS:
+            return super().fetchone()
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched([row] if row is not None else [], start)
+        return row
+
+    def fetchmany(self, size=None):
+        if not QUERY_HOOKS:
+            return super().fetchmany(size) if size is not None else super().fetchmany()
+        start = time.perf_counter()
+        rows = super().fetchmany(size) if size is not None else super().fetchmany()
+        self._fetched(rows, start)
+        return rows
+
+    def fetchall(self):
+        if not QUERY_HOOKS:
+            return super().fetchall()
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(rows, start)
+        return rows
+
+
+def connect_kwargs(statement_timeout_ms=None, application_name=None):
+    timeout = SETTINGS['statement_timeout_ms'] if statement_timeout_ms is None else statement_timeout_ms
+    return dict(
+        application_name=application_name or SETTINGS['application_name'],
+        client_encoding='UTF8',
+        options=f"-c statement_timeout={int(timeout)}",
+        cursor_factory=InstrumentedCursor,
+    )
+
+
+def connect(statement_timeout_ms=None, application_name=None):
+    return psycopg2.connect(host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
+                            **connect_kwargs(statement_timeout_ms, application_name))
+
+
+def connection_pool(maxconn, minconn=1, statement_timeout_ms=None, application_name=None):
+    # Thread-safe psycopg2 pool for scripts that manage raw connections themselves
+    return ThreadedConnectionPool(minconn, maxconn, host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER,
+                                  password=DB_PASSWORD, **connect_kwargs(statement_timeout_ms, application_name))
+
+
+def database_url(password=True):
+    return URL.create('postgresql+psycopg2', username=DB_USER, password=DB_PASSWORD if password else None,
+                      host=DB_HOST, port=DB_PORT, database=DB_NAME)
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(pool_size=None, max_overflow=None, statement_timeout_ms=None, application_name=None):
+    # One pooled engine per distinct configuration per process
+    pool_size = SETTINGS['pool_size'] if pool_size is None else pool_size
+    max_overflow = SETTINGS['max_overflow'] if max_overflow is None else max_overflow
+    key = (pool_size, max_overflow, statement_timeout_ms, application_name)
+    with _engines_lock:
+        if key not in _engines:
+            _engines[key] = create_engine(
+                database_url(),
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_pre_ping=True,
+                connect_args=connect_kwargs(statement_timeout_ms, application_name),
+            )
+        return _engines[key]
+
+
+@contextmanager
+def server_cursor(conn, name="stream", fetch_size=FETCH_SIZE):
+    # Named (server-side) cursor: the result stays on the server and is fetched fetch_size rows at a time
+    cur = conn.cursor(name=name)
+    cur.itersize = fetch_size
+    try:
+        yield cur
+    finally:
+        cur.close()
+
+
+def fetch_batches(cur, fetch_size=FETCH_SIZE):
+    batch = cur.fetchmany(fetch_size)
+    while batch:
+        yield batch
+        batch = cur.fetchmany(fetch_size)
+
+
+def script_name():
+    return os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+
+
+def enable_metrics(metrics_file=None, slow_query_ms=None, slow_query_log=None):
+    from query_metrics import QueryMetrics
+    metrics = QueryMetrics(
+        metrics_file=(SETTINGS['metrics_file'] if metrics_file is None else metrics_file).format(script=script_name()),
+        slow_query_ms=SETTINGS['slow_query_ms'] if slow_query_ms is None else slow_query_ms,
+        slow_query_log=SETTINGS['slow_query_log'] if slow_query_log is None else slow_query_log,
+        connect=connect,
+    )
+    add_query_hook(metrics)
+    atexit.register(metrics.close)
+    return metrics
+
+
+METRICS = None
+if SETTINGS['metrics_file'] or SETTINGS['slow_query_ms']:
+    METRICS = enable_metrics()
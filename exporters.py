@@ -0,0 +1,166 @@
+import csv
+import gzip
+import os
+import shutil
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from excel_export import peak_memory, write_workbook
+
+# Export targets for the reports. Every target reads the same row sources as the Excel
+# export (excel_export.stream_query / stream_frame: a column list, then row batches), so
+# each format streams batch by batch and never holds a full result:
+#   parquet  one directory per dataset, Hive-style partitions (year=2023/payment_status=Paid/)
+#   arrow    Arrow IPC file, one record batch per fetched batch
+#   csv      gzip-compressed CSV with a header row
+#   excel    one workbook, one sheet per dataset (excel_export.write_workbook)
+#
+# Datasets are passed as name -> callable returning a fresh source, because every
+# format needs its own pass over the rows.
+
+PARTITION_BY = ('year', 'payment_status')
+
+ARROW_TYPES = {
+    'date': pa.date32(),
+    'datetime': pa.timestamp('us'),
+    'integer': pa.int64(),
+    'number': pa.float64(),
+    'text': pa.string(),
+}
+
+
+def arrow_schema(columns):
+    return pa.schema([(name, ARROW_TYPES[kind]) for name, kind in columns])
+
+
+def to_record_batch(rows, columns, schema):
+    arrays = []
+    for values, (_, kind), field in zip(zip(*rows), columns, schema):
+        if kind == 'number':
+            # NUMERIC arrives as Decimal
+            values = [None if v is None else float(v) for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def date_column(columns):
+    # Index of the first date/datetime column, None if the result has none
+    return next((i for i, (_, kind) in enumerate(columns) if kind in ('date', 'datetime')), None)
+
+
+def partition_key(columns, partition_by):
+    # year is taken from the first date/datetime column unless the result has a year column
+    names = [name for name, _ in columns]
+    getters = []
+    for part in partition_by:
+        if part in names:
+            index = names.index(part)
+            getters.append(lambda row, i=index: row[i])
+        elif part == 'year':
+            index = date_column(columns)
+            if index is None:
+                raise ValueError(f"cannot partition by year: no year or date column in {names}")
+            getters.append(lambda row, i=index: row[i].year if row[i] is not None else None)
+        else:
+            raise ValueError(f"cannot partition by '{part}': not a column of {names}")
+    return lambda row: tuple(getter(row) for getter in getters)
+
+
+def partition_dir(partition_by, key):
+    # Hive-style, as read back by pyarrow.dataset(path, partitioning="hive")
+    parts = []
+    for name, value in zip(partition_by, key):
+        value = "__HIVE_DEFAULT_PARTITION__" if value is None else str(value).replace('/', '_')
+        parts.append(f"{name}={value}")
+    return os.path.join(*parts) if parts else ""
+
+
+def write_parquet(path, source, partition_by=PARTITION_BY):
+    columns = next(source)
+    names = [name for name, _ in columns]
+    # Partition columns live in the directory names, not in the files. A result without
+    # a year or date column is not split by year; one without any of them is written unpartitioned.
+    usable = [p for p in partition_by if p in names or (p == 'year' and date_column(columns) is not None)]
+    keep = [i for i, name in enumerate(names) if name not in usable]
+    file_columns = [columns[i] for i in keep]
+    schema = arrow_schema(file_columns)
+    key_of = partition_key(columns, usable)
+    # Start from an empty directory, so partitions from an earlier export do not linger
+    shutil.rmtree(path, ignore_errors=True)
+    writers = {}
+    rows = 0
+    try:
+        for batch in source:
+            groups = {}
+            for row in batch:
+                groups.setdefault(key_of(row), []).append(tuple(row[i] for i in keep))
+            for key, group in groups.items():
+                if key not in writers:
+                    directory = os.path.join(path, partition_dir(usable, key))
+                    os.makedirs(directory, exist_ok=True)
+                    writers[key] = pq.ParquetWriter(os.path.join(directory, "part-0.parquet"), schema)
+                writers[key].write_batch(to_record_batch(group, file_columns, schema))
+            rows += len(batch)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return rows
+
+
+def write_arrow(path, source):
+    columns = next(source)
+    schema = arrow_schema(columns)
+    rows = 0
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in source:
+            writer.write_batch(to_record_batch(batch, columns, schema))
+            rows += len(batch)
+    return rows
+
+
+def write_csv_gz(path, source):
+    columns = next(source)
+    rows = 0
+    with gzip.open(path, 'wt', newline='', encoding='utf-8', compresslevel=6) as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in columns])
+        for batch in source:
+            writer.writerows(batch)
+            rows += len(batch)
+    return rows
+
+
+FILE_TARGETS = {
+    'parquet': ('.parquet', write_parquet),
+    'arrow': ('.arrow', write_arrow),
+    'csv': ('.csv.gz', write_csv_gz),
+}
+FORMATS = ['excel'] + list(FILE_TARGETS)
+
+
+def export_datasets(datasets, formats, out_dir, report_name):
+    # datasets: name -> callable returning a source; returns one stats dict per format
+    os.makedirs(out_dir, exist_ok=True)
+    results = []
+    for fmt in formats:
+        if fmt == 'excel':
+            path = os.path.join(out_dir, f"{report_name}.xlsx")
+            stats = write_workbook(path, {name: make() for name, make in datasets.items()})
+            results.append({"format": fmt, "path": path, "rows": stats["rows"], "seconds": stats["seconds"]})
+            continue
+        suffix, write = FILE_TARGETS[fmt]
+        target_dir = os.path.join(out_dir, report_name)
+        os.makedirs(target_dir, exist_ok=True)
+        for name, make in datasets.items():
+            path = os.path.join(target_dir, f"{name}{suffix}")
+            start = time.perf_counter()
+            rows = write(path, make())
+            elapsed = time.perf_counter() - start
+            peak = peak_memory()
+            memory = f"{peak / 2 ** 20:.1f} MB" if peak is not None else "n/a"
+            print(f"+ Created {fmt} {os.path.relpath(path, os.getcwd())}, rows: {rows} "
+                  f"in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s), peak memory {memory}")
+            results.append({"format": fmt, "path": path, "rows": rows, "seconds": elapsed})
+    return results
@@ -0,0 +1,249 @@
+import argparse
+import time
+
+from sqlalchemy import text
+
+from db import get_engine
+from rollups import write_datasets
+
+# Map tiles for the patient map: patients are binned by geohash prefix, one prefix
+# length per zoom level (3 = ~150 km cells ... 7 = ~150 m cells), with patient counts
+# and billing totals per cell. The map reads one row per visible cell instead of one
+# point per patient.
+#
+# Updates are incremental. Statement-level triggers on patients and billing write the
+# patient_id of every inserted, updated or deleted row to patient_geo_tile_changes.
+# `update` takes those ids off the log, reads only their patients/billing rows and
+# compares them with patient_geo_tile_members, which holds what each patient last
+# contributed to the tiles. Only the differences are applied (+1 for the new cell, -1
+# for the old one) to every zoom level. A TRUNCATE, `create` and `rebuild` log '*',
+# which makes the next update read every patient. Needs the geohash column from
+# `add_geo_coords.py --geohash`, and an index on billing.patient_id (index_advisor.py)
+# to keep the billing lookups cheap.
+
+engine = get_engine()
+
+ZOOM_LEVELS = [3, 4, 5, 6, 7]
+TILE_TABLE = "patient_geo_tiles"
+MEMBER_TABLE = "patient_geo_tile_members"
+CHANGE_TABLE = "patient_geo_tile_changes"
+# Logged patient_id that stands for "every patient"
+ALL_PATIENTS = "*"
+CHANGE_SOURCES = ["patients", "billing"]
+# Trigger event -> transition tables it reads
+TRIGGER_EVENTS = {
+    "insert": "REFERENCING NEW TABLE AS new_rows",
+    "update": "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "delete": "REFERENCING OLD TABLE AS old_rows",
+    "truncate": "",
+}
+
+TILE_DATASET = {
+    "dttm": None,
+    "columns": {"zoom": "SMALLINT", "cell": "TEXT", "patient_count": "BIGINT", "center_lat": "NUMERIC",
+                "center_lon": "NUMERIC", "total_billed": "NUMERIC", "bill_count": "BIGINT"},
+    "sources": ["patients", "billing"],
+    "description": "Patients binned by geohash prefix per zoom level, maintained by geo_tiles.py",
+}
+
+
+def create_tables():
+    with engine.begin() as connection:
+        has_geohash = connection.execute(text("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'patients' AND column_name = 'geohash'
+        """)).scalar()
+        if not has_geohash:
+            raise SystemExit("patients.geohash is missing; run add_geo_coords.py --geohash first")
+        # Sums are stored so centers stay exact under incremental updates
+        connection.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {TILE_TABLE} (
+                zoom SMALLINT NOT NULL,
+                cell TEXT NOT NULL,
+                patient_count BIGINT NOT NULL,
+                lat_sum NUMERIC NOT NULL,
+                lon_sum NUMERIC NOT NULL,
+                total_billed NUMERIC NOT NULL,
+                bill_count BIGINT NOT NULL,
+                center_lat NUMERIC GENERATED ALWAYS AS (ROUND(lat_sum / NULLIF(patient_count, 0), 6)) STORED,
+                center_lon NUMERIC GENERATED ALWAYS AS (ROUND(lon_sum / NULLIF(patient_count, 0), 6)) STORED,
+                PRIMARY KEY (zoom, cell)
+            )
+        """))
+        connection.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {MEMBER_TABLE} (
+                patient_id TEXT PRIMARY KEY,
+                geohash TEXT NOT NULL,
+                latitude NUMERIC NOT NULL,
+                longitude NUMERIC NOT NULL,
+                total_billed NUMERIC NOT NULL,
+                bill_count BIGINT NOT NULL
+            )
+        """))
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS {CHANGE_TABLE} (patient_id TEXT PRIMARY KEY)"))
+        install_triggers(connection)
+        # Rows that existed before the triggers were not logged
+        connection.execute(text(f"INSERT INTO {CHANGE_TABLE} VALUES ('{ALL_PATIENTS}') ON CONFLICT DO NOTHING"))
+    print(f"Created {TILE_TABLE}, {MEMBER_TABLE} and {CHANGE_TABLE}")
+
+
+def install_triggers(connection):
+    # A trigger with transition tables can only fire on one event, hence one per event.
+    # Statement-level, so a COPY or a generator batch logs its ids in one INSERT.
+    for event, rows in [("insert", "new_rows"), ("delete", "old_rows")]:
+        connection.execute(text(f"""
+            CREATE OR REPLACE FUNCTION log_geo_tile_{event}() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO {CHANGE_TABLE}
+                SELECT DISTINCT patient_id FROM {rows} WHERE patient_id IS NOT NULL
+                ON CONFLICT DO NOTHING;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+    connection.execute(text(f"""
+        CREATE OR REPLACE FUNCTION log_geo_tile_update() RETURNS trigger AS $$
+        BEGIN
+            -- A bill moved to another patient changes both of them
+            INSERT INTO {CHANGE_TABLE}
+            SELECT patient_id FROM old_rows WHERE patient_id IS NOT NULL
+            UNION SELECT patient_id FROM new_rows WHERE patient_id IS NOT NULL
+            ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """))
+    connection.execute(text(f"""
+        CREATE OR REPLACE FUNCTION log_geo_tile_truncate() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO {CHANGE_TABLE} VALUES ('{ALL_PATIENTS}') ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """))
+    for table in CHANGE_SOURCES:
+        for event, clause in TRIGGER_EVENTS.items():
+            trigger = f"{table}_geo_tile_{event}"
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger} ON {table}"))
+            connection.execute(text(f"""
+                CREATE TRIGGER {trigger} AFTER {event.upper()} ON {table} {clause}
+                FOR EACH STATEMENT EXECUTE FUNCTION log_geo_tile_{event}()
+            """))
+        print(f"Installed change log triggers on {table}")
+
+
+def update_tiles():
+    start = time.perf_counter()
+    zooms = ", ".join(str(z) for z in ZOOM_LEVELS)
+    with engine.begin() as connection:
+        # A reload with load_to_postgres.py --mode replace drops the tables and their triggers
+        names = [f"{table}_geo_tile_{event}" for table in CHANGE_SOURCES for event in TRIGGER_EVENTS]
+        triggers = connection.execute(text(
+            "SELECT COUNT(*) FROM pg_trigger WHERE tgname = ANY(:names)"), {"names": names}).scalar()
+        if connection.execute(text("SELECT to_regclass(:t)"), {"t": CHANGE_TABLE}).scalar() is None \
+                or triggers < len(names):
+            raise SystemExit(f"{CHANGE_TABLE} or its triggers are missing; run `python geo_tiles.py create` first")
+        # Taken off the log in this transaction: if the update fails, the ids are logged again
+        connection.execute(text("CREATE TEMP TABLE geo_dirty (patient_id TEXT) ON COMMIT DROP"))
+        connection.execute(text(f"""
+            WITH taken AS (DELETE FROM {CHANGE_TABLE} RETURNING patient_id)
+            INSERT INTO geo_dirty SELECT patient_id FROM taken
+        """))
+        full = connection.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM geo_dirty WHERE patient_id = :all)"), {"all": ALL_PATIENTS}).scalar()
+        # Without '*' only the logged patients are read, from patients, billing and the members
+        only = "" if full else "WHERE patient_id IN (SELECT patient_id FROM geo_dirty)"
+        only_p = "" if full else "AND p.patient_id IN (SELECT patient_id FROM geo_dirty)"
+        connection.execute(text(f"""
+            CREATE TEMP TABLE geo_snapshot ON COMMIT DROP AS
+            SELECT p.patient_id, p.geohash, p.latitude, p.longitude,
+                   COALESCE(b.total_billed, 0) AS total_billed,
+                   COALESCE(b.bill_count, 0) AS bill_count
+            FROM patients p
+            LEFT JOIN (
+                SELECT patient_id, SUM(amount) AS total_billed, COUNT(*) AS bill_count
+                FROM billing {only} GROUP BY patient_id
+            ) b ON b.patient_id = p.patient_id
+            WHERE p.geohash IS NOT NULL AND p.latitude IS NOT NULL AND p.longitude IS NOT NULL
+              {only_p}
+        """))
+        # Patients that are new, moved, removed or had bills change since the last update
+        connection.execute(text(f"""
+            CREATE TEMP TABLE geo_changes ON COMMIT DROP AS
+            SELECT COALESCE(s.patient_id, m.patient_id) AS patient_id,
+                   m.geohash AS old_geohash, m.latitude AS old_lat, m.longitude AS old_lon,
+                   m.total_billed AS old_billed, m.bill_count AS old_bills,
+                   s.geohash AS new_geohash, s.latitude AS new_lat, s.longitude AS new_lon,
+                   s.total_billed AS new_billed, s.bill_count AS new_bills
+            FROM geo_snapshot s
+            FULL JOIN (SELECT * FROM {MEMBER_TABLE} {only}) m ON m.patient_id = s.patient_id
+            WHERE (s.geohash, s.latitude, s.longitude, s.total_billed, s.bill_count)
+                  IS DISTINCT FROM (m.geohash, m.latitude, m.longitude, m.total_billed, m.bill_count)
+        """))
+        changed = connection.execute(text("SELECT COUNT(*) FROM geo_changes")).scalar()
+        if changed:
+            connection.execute(text(f"""
+                INSERT INTO {TILE_TABLE} AS t (zoom, cell, patient_count, lat_sum, lon_sum, total_billed, bill_count)
+                SELECT z.zoom, LEFT(d.geohash, z.zoom),
+                       SUM(d.sign), SUM(d.sign * d.lat), SUM(d.sign * d.lon),
+                       SUM(d.sign * d.billed), SUM(d.sign * d.bills)
+                FROM (
+                    SELECT 1 AS sign, new_geohash AS geohash, new_lat AS lat, new_lon AS lon,
+                           new_billed AS billed, new_bills AS bills
+                    FROM geo_changes WHERE new_geohash IS NOT NULL
+                    UNION ALL
+                    SELECT -1, old_geohash, old_lat, old_lon, old_billed, old_bills
+                    FROM geo_changes WHERE old_geohash IS NOT NULL
+                ) d
+                CROSS JOIN unnest(ARRAY[{zooms}]) AS z(zoom)
+                GROUP BY 1, 2
+                ON CONFLICT (zoom, cell) DO UPDATE SET
+                    patient_count = t.patient_count + EXCLUDED.patient_count,
+                    lat_sum = t.lat_sum + EXCLUDED.lat_sum,
+                    lon_sum = t.lon_sum + EXCLUDED.lon_sum,
+                    total_billed = t.total_billed + EXCLUDED.total_billed,
+                    bill_count = t.bill_count + EXCLUDED.bill_count
+            """))
+            connection.execute(text(f"DELETE FROM {TILE_TABLE} WHERE patient_count <= 0"))
+            connection.execute(text(f"""
+                DELETE FROM {MEMBER_TABLE} m USING geo_changes c WHERE m.patient_id = c.patient_id
+            """))
+            connection.execute(text(f"""
+                INSERT INTO {MEMBER_TABLE}
+                SELECT s.patient_id, s.geohash, s.latitude, s.longitude, s.total_billed, s.bill_count
+                FROM geo_snapshot s JOIN geo_changes c ON c.patient_id = s.patient_id
+            """))
+        cells = connection.execute(text(f"SELECT COUNT(*) FROM {TILE_TABLE}")).scalar()
+    scope = "all patients" if full else "logged patients"
+    print(f"Applied {changed} changed patients ({scope}) in {time.perf_counter() - start:.2f}s ({cells} cells)")
+
+
+def rebuild_tiles():
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {TILE_TABLE}, {MEMBER_TABLE}"))
+        connection.execute(text(f"INSERT INTO {CHANGE_TABLE} VALUES ('{ALL_PATIENTS}') ON CONFLICT DO NOTHING"))
+    update_tiles()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain geohash map tiles for the patient map")
+    parser.add_argument("command", choices=["create", "update", "rebuild", "datasets"])
+    parser.add_argument("--every", type=float, default=0,
+                        help="with update: repeat every N seconds until Ctrl+C")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        create_tables()
+    elif args.command == "rebuild":
+        rebuild_tiles()
+    elif args.command == "datasets":
+        write_datasets(datasets={TILE_TABLE: TILE_DATASET})
+    elif args.every > 0:
+        try:
+            while True:
+                update_tiles()
+                time.sleep(args.every)
+        except KeyboardInterrupt:
+            print("Update loop stopped.")
+    else:
+        update_tiles()
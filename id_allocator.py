@@ -0,0 +1,103 @@
+# Hands out prefixed keys (P/D/A/T/B + number) from one PostgreSQL sequence per table.
+# nextval() never returns the same number twice, so any number of generator processes
+# can insert side by side without colliding. Numbers are fetched in blocks, one round
+# trip per block_size ids. Numbers taken but never inserted leave gaps, which is fine for keys.
+#
+# Keys are zero-padded to ID_WIDTH digits so they still sort correctly as text
+# (A000000999 < A000001000, where A999 > A1000). migrate_ids.py rewrites keys created
+# with the old 3-digit format.
+
+ID_WIDTH = 9
+DEFAULT_BLOCK_SIZE = 100
+
+# table -> (key column, prefix)
+ID_TABLES = {
+    'patients': ('patient_id', 'P'),
+    'doctors': ('doctor_id', 'D'),
+    'appointments': ('appointment_id', 'A'),
+    'treatments': ('treatment_id', 'T'),
+    'billing': ('bill_id', 'B'),
+}
+KEY_PATTERN = f'^[A-Z][0-9]{{1,{ID_WIDTH}}}$'
+
+
+def format_id(prefix, number):
+    return f"{prefix}{number:0{ID_WIDTH}d}"
+
+
+def normalize_id_column(series):
+    # Pads "A1" / "A001" style keys in a pandas Series to the canonical width
+    parts = series.astype("string").str.extract(f'^([A-Z])([0-9]{{1,{ID_WIDTH}}})$')
+    matched = parts[0].notna()
+    result = series.copy()
+    result[matched] = parts[0][matched] + parts[1][matched].str.zfill(ID_WIDTH)
+    return result
+
+
+def sequence_name(table):
+    return f"{table}_id_seq"
+
+
+def sync_sequence(cur, table):
+    # Moves the sequence past the largest key in the table; never moves it backwards.
+    # Run while no generator is inserting (it is called on creation and by the loaders).
+    column, _ = ID_TABLES[table]
+    seq = sequence_name(table)
+    cur.execute(f"""
+        SELECT setval('{seq}', GREATEST(
+            (SELECT COALESCE(MAX(CAST(SUBSTRING({column} FROM 2) AS BIGINT)), 0)
+             FROM {table} WHERE {column} ~ '{KEY_PATTERN}'),
+            (SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {seq}),
+            1))
+    """)
+
+
+def ensure_sequence(conn, table):
+    # Creates the sequence on first use, seeded from the existing keys. The advisory lock
+    # keeps two processes starting at the same moment from both seeding it.
+    seq = sequence_name(table)
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (seq,))
+        cur.execute("SELECT to_regclass(%s)", (seq,))
+        if cur.fetchone()[0] is None:
+            cur.execute(f"CREATE SEQUENCE {seq}")
+            sync_sequence(cur, table)
+    conn.commit()
+
+
+class IdAllocator:
+    def __init__(self, conn, table, block_size=DEFAULT_BLOCK_SIZE):
+        self.conn = conn
+        self.table = table
+        self.prefix = ID_TABLES[table][1]
+        self.sequence = sequence_name(table)
+        self.block_size = block_size
+        self.block = []
+        ensure_sequence(conn, table)
+
+    def _refill(self, count):
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT nextval(%s) FROM generate_series(1, %s)", (self.sequence, count))
+            self.block.extend(row[0] for row in cur.fetchall())
+
+    def take(self, count):
+        if len(self.block) < count:
+            self._refill(max(count - len(self.block), self.block_size))
+        numbers, self.block = self.block[:count], self.block[count:]
+        return [format_id(self.prefix, n) for n in numbers]
+
+    def next_id(self):
+        return self.take(1)[0]
+
+
+def sync_all_sequences(conn):
+    with conn.cursor() as cur:
+        for table in ID_TABLES:
+            cur.execute("SELECT to_regclass(%s), to_regclass(%s)", (table, sequence_name(table)))
+            table_exists, seq_exists = cur.fetchone()
+            if table_exists is None:
+                continue
+            if seq_exists is None:
+                cur.execute(f"CREATE SEQUENCE {sequence_name(table)}")
+            sync_sequence(cur, table)
+    conn.commit()
@@ -0,0 +1,279 @@
+import argparse
+import json
+import time
+
+from sqlalchemy import text
+
+from db import get_engine
+from query_pack import read_queries
+from schema import foreign_keys, primary_keys
+
+engine = get_engine()
+
+QUERY_FILES = ["queries.sql", "visual_query.sql"]
+
+# Indexes the hospital_db workload can use. Every join in the packs goes
+# appointments -> treatments -> billing over the FK columns, the year filters hit the
+# date columns, and the payment aggregates only need payment_status/method/amount.
+# (name, table, definition, reason)
+FK_INDEXES = [
+    (f"idx_{table}_{column}", table, f"({column})", f"FK {constraint} -> {ref_table}")
+    for table, constraint, column, ref_table, _ in foreign_keys
+]
+COVERING_INDEXES = [
+    ("idx_billing_status_date_cover", "billing",
+     "(payment_status, bill_date) INCLUDE (payment_method, amount, bill_id)",
+     "payment_status / payment_method aggregates without heap access"),
+]
+DATE_COLUMNS = [
+    ("appointments", "appointment_date"),
+    ("billing", "bill_date"),
+    ("treatments", "treatment_date"),
+]
+
+# Tables that can be range-partitioned by year, keyed on their date column
+PARTITION_KEYS = {
+    "appointments": "appointment_date",
+    "billing": "bill_date",
+}
+
+
+def candidate_indexes(date_index="brin"):
+    candidates = list(FK_INDEXES)
+    for table, column in DATE_COLUMNS:
+        if date_index == "brin":
+            # BRIN stays tiny and works well while rows arrive roughly in date order
+            candidates.append((f"brin_{table}_{column}", table, f"USING brin ({column})",
+                               "year range filters (BRIN)"))
+        else:
+            candidates.append((f"idx_{table}_{column}", table, f"({column})",
+                               "year range filters (B-tree)"))
+    candidates.extend(COVERING_INDEXES)
+    return candidates
+
+
+def existing_indexes(connection):
+    rows = connection.execute(text(
+        "SELECT tablename, indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema()"))
+    return {row.indexname: (row.tablename, row.indexdef) for row in rows}
+
+
+def seq_scanned_tables(plan):
+    # Walk an EXPLAIN JSON plan and collect relations read with a sequential scan
+    found = set()
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name"):
+        found.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found |= seq_scanned_tables(child)
+    return found
+
+
+def explain(connection, sql):
+    # ANALYZE really runs the query; the packs are all read-only SELECTs
+    row = connection.execute(text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)).scalar()
+    result = row[0] if isinstance(row, list) else json.loads(row)[0]
+    plan = result["Plan"]
+    return {
+        "execution_ms": result["Execution Time"],
+        "planning_ms": result["Planning Time"],
+        "shared_hit": plan.get("Shared Hit Blocks", 0),
+        "shared_read": plan.get("Shared Read Blocks", 0),
+        "seq_scans": seq_scanned_tables(plan),
+    }
+
+
+def profile_queries(queries):
+    results = {}
+    with engine.connect() as connection:
+        for q in queries:
+            try:
+                with connection.begin():
+                    results[q["name"]] = explain(connection, q["sql"])
+            except Exception as e:
+                print(f"Error explaining '{q['name']}': {e}")
+    return results
+
+
+def propose(queries, profile, existing, date_index):
+    proposals = []
+    for name, table, definition, reason in candidate_indexes(date_index):
+        if name in existing:
+            continue
+        used_by = [q["name"] for q in queries
+                   if q["name"] in profile and table in profile[q["name"]]["seq_scans"]]
+        proposals.append({"name": name, "table": table, "definition": definition,
+                          "reason": reason, "seq_scanned_by": used_by})
+    return proposals
+
+
+def is_partitioned(connection, table):
+    return connection.execute(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table}).scalar()
+
+
+def create_indexes(proposals):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block, and is not
+    # supported on partitioned tables, which get a plain CREATE INDEX instead
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for p in proposals:
+            start = time.perf_counter()
+            concurrently = "" if is_partitioned(connection, p["table"]) else "CONCURRENTLY "
+            try:
+                connection.execute(text(
+                    f"CREATE INDEX {concurrently}IF NOT EXISTS {p['name']} ON {p['table']} {p['definition']}"))
+                print(f"Created {p['name']} on {p['table']} in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                print(f"Error creating {p['name']}: {e}")
+        for table in {p["table"] for p in proposals}:
+            connection.execute(text(f"ANALYZE {table}"))
+
+
+def table_indexes(connection, table):
+    # (name, definition) of the plain indexes on `table`; the primary key is handled separately
+    rows = connection.execute(text("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = to_regclass(:t)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+    """), {"t": table})
+    return [tuple(row) for row in rows]
+
+
+def partition_by_year(table, drop_referencing_fks=False):
+    # Rebuilds `table` as a RANGE-partitioned table with one partition per year (plus a
+    # DEFAULT partition for out-of-range dates) and swaps it in under the same name.
+    # The old table is kept as <table>_unpartitioned until you drop it yourself; its
+    # indexes are renamed to <index>_unpartitioned and created again on the new table.
+    # PostgreSQL requires the partition key in the primary key, so the new key is
+    # (id, date) and rows without a date are refused. Nothing can reference a plain
+    # unique id on a partitioned table, so foreign keys *into* the table have to be
+    # dropped, which only happens with drop_referencing_fks. The new key also means
+    # load_to_postgres.py --mode incremental (ON CONFLICT on the id) no longer works
+    # on this table.
+    key = PARTITION_KEYS[table]
+    pk = primary_keys[table]
+    new_table = f"{table}_partitioned"
+    old_table = f"{table}_unpartitioned"
+    referencing = [fk for fk in foreign_keys if fk[3] == table]
+    if referencing and not drop_referencing_fks:
+        names = ", ".join(f"{child}.{constraint}" for child, constraint, _, _, _ in referencing)
+        raise ValueError(f"{names} reference {table}; partitioning it drops them, "
+                         f"pass --drop-referencing-fks to go ahead")
+    with engine.begin() as connection:
+        if is_partitioned(connection, table):
+            raise ValueError(f"{table} is already partitioned")
+        missing = connection.execute(text(f"SELECT COUNT(*) FROM {table} WHERE {key} IS NULL")).scalar()
+        if missing:
+            raise ValueError(f"{missing} rows of {table} have no {key}, which has to be part of the "
+                             f"primary key; fill or delete them first")
+        indexes = table_indexes(connection, table)
+        years = connection.execute(text(
+            f"SELECT EXTRACT(YEAR FROM MIN({key}))::int, EXTRACT(YEAR FROM MAX({key}))::int FROM {table}")).one()
+        connection.execute(text(
+            f"CREATE TABLE {new_table} (LIKE {table} INCLUDING DEFAULTS) PARTITION BY RANGE ({key})"))
+        if years[0] is not None:
+            for year in range(years[0], years[1] + 1):
+                connection.execute(text(
+                    f"CREATE TABLE {table}_y{year} PARTITION OF {new_table} "
+                    f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"))
+        connection.execute(text(f"CREATE TABLE {table}_default PARTITION OF {new_table} DEFAULT"))
+        connection.execute(text(f"INSERT INTO {new_table} SELECT * FROM {table}"))
+
+        for child, constraint, _, _, _ in referencing:
+            connection.execute(text(f"ALTER TABLE {child} DROP CONSTRAINT IF EXISTS {constraint}"))
+            print(f"Dropped {child}.{constraint}: it cannot reference a partitioned {table}")
+
+        connection.execute(text(f"ALTER TABLE {table} RENAME TO {old_table}"))
+        connection.execute(text(f"ALTER TABLE {old_table} RENAME CONSTRAINT {table}_pkey TO {old_table}_pkey"))
+        # Free the index names, otherwise existing_indexes() and CREATE INDEX IF NOT EXISTS
+        # would take the old table's indexes for the new table's
+        for name, _ in indexes:
+            connection.execute(text(f"ALTER INDEX {name} RENAME TO {name[:49]}_unpartitioned"))
+        connection.execute(text(f"ALTER TABLE {new_table} RENAME TO {table}"))
+        connection.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY ({pk}, {key})"))
+        for name, definition in indexes:
+            # Read before the rename, so the definition already points at the new (partitioned) table
+            try:
+                with connection.begin_nested():
+                    connection.execute(text(definition))
+                print(f"Recreated {name} on the partitioned {table}")
+            except Exception as e:
+                print(f"Error recreating {name} on {table}: {e}")
+        for child, constraint, column, ref_table, ref_column in foreign_keys:
+            if child == table:
+                connection.execute(text(
+                    f"ALTER TABLE {table} ADD CONSTRAINT {constraint} "
+                    f"FOREIGN KEY ({column}) REFERENCES {ref_table}({ref_column})"))
+        connection.execute(text(f"ANALYZE {table}"))
+    print(f"Partitioned {table} by year on {key}; previous table kept as {old_table}")
+
+
+def print_report(queries, before, after):
+    print(f"\n{'query':<60} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for q in queries:
+        b = before.get(q["name"])
+        a = after.get(q["name"]) if after else None
+        if b is None:
+            continue
+        line = f"{q['name'][:60]:<60} {b['execution_ms']:>10.2f}"
+        if a is not None:
+            speedup = b["execution_ms"] / a["execution_ms"] if a["execution_ms"] else float("inf")
+            line += f" {a['execution_ms']:>10.2f} {speedup:>7.1f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suggest and create indexes for the hospital_db query packs")
+    parser.add_argument("--apply", action="store_true", help="create the proposed indexes")
+    parser.add_argument("--date-index", choices=["brin", "btree"], default="brin",
+                        help="index type for the date columns")
+    parser.add_argument("--partition", nargs="+", choices=sorted(PARTITION_KEYS), default=[],
+                        help="also range-partition these tables by year (their key becomes (id, date), "
+                             "so load_to_postgres.py --mode incremental stops working on them)")
+    parser.add_argument("--drop-referencing-fks", action="store_true",
+                        help="allow --partition to drop the foreign keys that point at a partitioned table")
+    parser.add_argument("--report", help="write the before/after timings to this JSON file")
+    args = parser.parse_args()
+
+    queries = []
+    for path in QUERY_FILES:
+        for q in read_queries(path):
+            q["name"] = f"{path}: {q['name']}"
+            queries.append(q)
+
+    print(f"Profiling {len(queries)} queries...")
+    before = profile_queries(queries)
+    with engine.connect() as connection:
+        proposals = propose(queries, before, existing_indexes(connection), args.date_index)
+
+    print("\nProposed indexes:")
+    for p in proposals:
+        users = f" (seq scan in {len(p['seq_scanned_by'])} queries)" if p["seq_scanned_by"] else ""
+        print(f"  CREATE INDEX {p['name']} ON {p['table']} {p['definition']};  -- {p['reason']}{users}")
+    if not proposals:
+        print("  none, all candidate indexes already exist")
+
+    after = None
+    if args.apply or args.partition:
+        for table in args.partition:
+            try:
+                partition_by_year(table, args.drop_referencing_fks)
+            except Exception as e:
+                print(f"Error partitioning {table}: {e}")
+        if args.partition:
+            # The partitioned tables start out with only the indexes carried over from the old ones
+            with engine.connect() as connection:
+                proposals = propose(queries, before, existing_indexes(connection), args.date_index)
+        if args.apply:
+            create_indexes(proposals)
+        after = profile_queries(queries)
+
+    print_report(queries, before, after)
+
+    if args.report:
+        def plain(profile):
+            return {name: {**r, "seq_scans": sorted(r["seq_scans"])} for name, r in profile.items()}
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"proposals": proposals, "before": plain(before),
+                       "after": plain(after) if after else None}, f, indent=2)
+        print(f"Report written to {args.report}")
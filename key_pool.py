@@ -0,0 +1,152 @@
+import random
+import re
+import threading
+from array import array
+
+from db import fetch_batches, server_cursor
+from id_allocator import ID_TABLES, ID_WIDTH, format_id
+
+# Pool of parent keys (patients, doctors, appointments, ...) for the generators.
+# Canonical keys (prefix + ID_WIDTH digits, see id_allocator.py) are stored as 64-bit
+# integers in an array, 8 bytes per key, so sampling is one random index.
+# Keys in any other format go to a small side list.
+#
+# refresh() only asks the database for keys at or above a watermark a little below the
+# highest key seen so far. Fixed-width keys compare correctly as text, so this is an
+# index range scan on the primary key. The overlap catches rows that committed out of
+# order, since sequence numbers are taken before the insert commits. It has to cover
+# every id that can still be uncommitted while higher ones are already visible: per
+# writer, the rest of its IdAllocator block plus the rows it has not committed yet
+# (see overlap_for; PoolRefresher refuses a smaller one). In case that assumption
+# does not hold, e.g. for writers it was not told about, every RESCAN_EVERY-th refresh
+# reads the whole table again. Keys above the watermark are remembered so they are not
+# added twice. Old short keys (A001) sort above the watermark as text and are re-read
+# on every refresh, so run migrate_ids.py first.
+
+OVERLAP = 10000
+RESCAN_EVERY = 60
+
+
+def overlap_for(block_size, commit_size, writers=1):
+    # Ids that can sit below the highest committed id without being committed themselves
+    return max(OVERLAP, writers * (block_size + commit_size))
+
+
+class KeyPool:
+    def __init__(self, table, overlap=OVERLAP, rescan_every=RESCAN_EVERY):
+        self.table = table
+        self.column, self.prefix = ID_TABLES[table]
+        self.overlap = overlap
+        self.rescan_every = rescan_every
+        self.refreshes = 0
+        self.numbers = array('q')
+        self.other = []
+        self.other_seen = set()
+        self.recent = set()
+        self.last_seen = 0
+        self.lock = threading.Lock()
+        self.pattern = re.compile(f"^{self.prefix}([0-9]{{{ID_WIDTH}}})$")
+
+    def watermark(self):
+        return max(self.last_seen - self.overlap, 0)
+
+    def _add(self, key):
+        match = self.pattern.match(key)
+        if match is None:
+            if key not in self.other_seen:
+                self.other_seen.add(key)
+                self.other.append(key)
+            return
+        number = int(match.group(1))
+        if number >= self.watermark():
+            if number in self.recent:
+                return
+            self.recent.add(number)
+        self.numbers.append(number)
+        if number > self.last_seen:
+            self.last_seen = number
+
+    def add(self, keys):
+        with self.lock:
+            for key in keys:
+                self._add(key)
+
+    def sample(self):
+        # No lock needed: array reads are atomic under the GIL, and a rescan swaps in
+        # new lists instead of changing these
+        numbers, other = self.numbers, self.other
+        index = random.randrange(len(numbers) + len(other))
+        if index < len(numbers):
+            return format_id(self.prefix, numbers[index])
+        return other[index - len(numbers)]
+
+    def __len__(self):
+        return len(self.numbers) + len(self.other)
+
+    def load(self, conn, fetch_size=50000):
+        # One full read at startup, streamed through a server-side cursor
+        with server_cursor(conn, f"pool_{self.table}", fetch_size) as cur:
+            cur.execute(f"SELECT {self.column} FROM {self.table}")
+            for batch in fetch_batches(cur, fetch_size):
+                self.add(row[0] for row in batch)
+                self._prune()
+        conn.commit()
+        return self
+
+    def refresh(self, conn):
+        # Incremental: only keys at or above the watermark are read again
+        self.refreshes += 1
+        if self.rescan_every and self.refreshes % self.rescan_every == 0:
+            return self.rescan(conn)
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT {self.column} FROM {self.table} WHERE {self.column} >= %s",
+                        (format_id(self.prefix, self.watermark()),))
+            rows = cur.fetchall()
+        conn.commit()
+        before = len(self)
+        self.add(row[0] for row in rows)
+        self._prune()
+        return len(self) - before
+
+    def rescan(self, conn):
+        # Full read into a new pool, swapped in whole; keys a worker added meanwhile and the
+        # read missed are near the top, so the next refresh finds them again
+        fresh = KeyPool(self.table, self.overlap, self.rescan_every).load(conn)
+        with self.lock:
+            added = len(fresh) - len(self)
+            self.numbers, self.other, self.other_seen = fresh.numbers, fresh.other, fresh.other_seen
+            self.recent, self.last_seen = fresh.recent, max(self.last_seen, fresh.last_seen)
+        return added
+
+    def _prune(self):
+        with self.lock:
+            low = self.watermark()
+            self.recent = {n for n in self.recent if n >= low}
+
+
+class PoolRefresher(threading.Thread):
+    # Polls the given pools every `interval` seconds on its own connection.
+    # min_overlap: overlap_for() of the writers feeding the pools
+    def __init__(self, pools, connect, interval, stop, min_overlap=OVERLAP):
+        small = [pool.table for pool in pools if pool.overlap < min_overlap]
+        if small:
+            raise ValueError(f"pools {small} re-read fewer than {min_overlap} ids below their highest key; "
+                             f"late commits below that would never be added")
+        super().__init__(name="pool-refresher", daemon=True)
+        self.pools = pools
+        self.connect = connect
+        self.interval = interval
+        self.stop = stop
+
+    def run(self):
+        conn = self.connect()
+        try:
+            while not self.stop.wait(self.interval):
+                for pool in self.pools:
+                    try:
+                        pool.refresh(conn)
+                    except Exception as e:
+                        conn.rollback()
+                        print(f"[{pool.table} pool] refresh failed: {e}")
+        finally:
+            conn.close()
@@ -0,0 +1,250 @@
+import argparse
+import csv
+import io
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+from psycopg2.extras import execute_values
+from faker import Faker
+
+from db import connect
+from id_allocator import IdAllocator
+from key_pool import KeyPool, PoolRefresher, overlap_for
+
+# Synthetic live traffic for the dashboards. One worker thread per table inserts
+# batches at a target rate (rows/s) with execute_values or COPY, committing every
+# --commit-size rows. Each batch runs under a savepoint, so a failing batch is rolled
+# back on its own and the batches before it still commit; rows that never made it are
+# reported. Foreign keys are drawn from in-memory pools of existing ids. The appointments
+# a worker inserts go straight into the pool the treatments worker uses, and a refresher
+# thread adds rows other processes inserted (see key_pool.py).
+
+fake = Faker()
+
+specializations = ['Dermatology', 'Pediatrics', 'Oncology']
+hospital_branches = ['Central Hospital', 'Eastside Clinic', 'Westside Clinic']
+reasons = ['Therapy', 'Consultation', 'Emergency', 'Checkup', 'Follow-up']
+statuses = ['Scheduled', 'No-show', 'Cancelled', 'Completed']
+times = ['08:00:00', '09:15:00', '10:30:00', '11:45:00', '12:00:00', '13:15:00', '14:30:00', '15:45:00', '16:00:00', '17:15:00']
+treatment_types = ['Chemotherapy', 'MRI', 'ECG', 'Physiotherapy', 'X-Ray']
+descriptions = [
+    "Basic screening", "Standard procedure", "Advanced protocol", "Initial assessment",
+    "Follow-up consultation", "Emergency intervention", "Routine checkup", "Diagnostic imaging",
+    "Therapeutic session", "Post-operative care", "Blood tests and analysis", "Minor surgical procedure",
+    "Rehabilitation exercises", "Pain management plan", "Vaccination administration", "Allergy testing",
+    "Ultrasound examination", "Cardiac monitoring", "Dermatological treatment", "Oncology follow-up",
+    "Pediatric evaluation", "Endoscopy procedure", "Biopsy sampling", "Physiotherapy session",
+    "Radiotherapy dose"
+]
+
+
+def doctor_row(doctor_id, pools):
+    return (doctor_id, fake.first_name(), fake.last_name(), random.choice(specializations),
+            int(fake.numerify('##########')), random.randint(1, 30), random.choice(hospital_branches),
+            fake.email())
+
+
+def appointment_row(appointment_id, pools):
+    app_date = datetime.now() + timedelta(days=random.randint(1, 365))
+    return (appointment_id, pools['patients'].sample(), pools['doctors'].sample(),
+            app_date.strftime('%Y-%m-%d'), random.choice(times), random.choice(reasons),
+            random.choice(statuses))
+
+
+def treatment_row(treatment_id, pools):
+    treatment_date = datetime.now() + timedelta(days=random.randint(-365, 365))
+    return (treatment_id, pools['appointments'].sample(), random.choice(treatment_types),
+            random.choice(descriptions), round(random.uniform(100.0, 5000.0), 2),
+            treatment_date.strftime('%Y-%m-%d'))
+
+
+# table -> insert columns, row builder, pools read
+TABLES = {
+    'doctors': dict(columns=['doctor_id', 'first_name', 'last_name', 'specialization', 'phone_number',
+                             'years_experience', 'hospital_branch', 'email'],
+                    make_row=doctor_row, parents=[]),
+    'appointments': dict(columns=['appointment_id', 'patient_id', 'doctor_id', 'appointment_date',
+                                  'appointment_time', 'reason_for_visit', 'status'],
+                         make_row=appointment_row, parents=['patients', 'doctors']),
+    'treatments': dict(columns=['treatment_id', 'appointment_id', 'treatment_type', 'description', 'cost',
+                                'treatment_date'],
+                       make_row=treatment_row, parents=['appointments']),
+}
+
+
+def insert_values(cur, table, columns, rows):
+    execute_values(cur, f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s", rows, page_size=len(rows))
+
+
+def insert_copy(cur, table, columns, rows):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+def allocator_block(batch_size):
+    return max(batch_size, 100)
+
+
+class TableWorker(threading.Thread):
+    def __init__(self, table, rate, pools, batch_size, commit_size, method, stop):
+        super().__init__(name=f"gen-{table}", daemon=True)
+        self.table = table
+        self.spec = TABLES[table]
+        self.rate = rate
+        self.pools = pools
+        self.batch_size = batch_size
+        self.commit_size = commit_size
+        self.insert = insert_copy if method == 'copy' else insert_values
+        self.stop = stop
+        self.inserted = 0
+        self.errors = 0
+        self.failed_rows = 0
+
+    def run(self):
+        conn = connect()
+        cur = conn.cursor()
+        # Keys come from the table's id sequence a block at a time, so other generator
+        # processes on the same database never produce the same key
+        ids = IdAllocator(conn, self.table, block_size=allocator_block(self.batch_size))
+        # Small rates get small batches so rows still trickle in every second or so
+        batch_size = max(1, min(self.batch_size, int(self.rate)))
+        interval = batch_size / self.rate
+        uncommitted = []
+        next_tick = time.monotonic()
+        try:
+            while not self.stop.is_set():
+                batch_ids = ids.take(batch_size)
+                rows = [self.spec['make_row'](row_id, self.pools) for row_id in batch_ids]
+                batch_done = False
+                try:
+                    cur.execute("SAVEPOINT batch")
+                    self.insert(cur, self.table, self.spec['columns'], rows)
+                    cur.execute("RELEASE SAVEPOINT batch")
+                    uncommitted.extend(batch_ids)
+                    batch_done = True
+                    if len(uncommitted) >= self.commit_size:
+                        conn.commit()
+                        self.publish(uncommitted)
+                        uncommitted = []
+                except psycopg2.Error as e:
+                    self.errors += 1
+                    if not batch_done:
+                        # The batch itself failed: only it is undone
+                        self.failed_rows += len(rows)
+                        try:
+                            cur.execute("ROLLBACK TO SAVEPOINT batch")
+                        except psycopg2.Error:
+                            conn.rollback()
+                            self.failed_rows += len(uncommitted)
+                            uncommitted = []
+                    else:
+                        # The commit failed: every row since the last commit is lost
+                        conn.rollback()
+                        self.failed_rows += len(uncommitted)
+                        uncommitted = []
+                    print(f"[{self.table}] batch failed: {str(e).strip().splitlines()[0]}")
+                next_tick += interval
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    self.stop.wait(delay)
+                else:
+                    # Behind schedule: do not try to catch up with a burst
+                    next_tick = time.monotonic()
+            conn.commit()
+            self.publish(uncommitted)
+        finally:
+            cur.close()
+            conn.close()
+
+    def publish(self, ids):
+        # Only committed ids become visible to other workers as parent keys
+        self.inserted += len(ids)
+        if self.table in self.pools:
+            self.pools[self.table].add(ids)
+
+
+def parse_rates(values):
+    rates = {}
+    for item in values:
+        table, _, rate = item.partition('=')
+        try:
+            rate = float(rate)
+        except ValueError:
+            rate = None
+        # A zero or negative rate would divide by zero or sleep backwards in the worker
+        if table not in TABLES or rate is None or not 0 < rate < float('inf'):
+            raise argparse.ArgumentTypeError(f"expected TABLE=ROWS_PER_SEC with TABLE in {sorted(TABLES)} "
+                                             f"and a positive rate, got '{item}'")
+        rates[table] = rate
+    return rates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Insert synthetic hospital traffic at target rates")
+    parser.add_argument("--rate", action="append", default=[], metavar="TABLE=ROWS_PER_SEC",
+                        help="target rate per table, e.g. --rate appointments=2000 --rate treatments=1000")
+    parser.add_argument("--batch-size", type=int, default=500, help="rows per INSERT/COPY statement")
+    parser.add_argument("--commit-size", type=int, default=5000, help="rows per commit")
+    parser.add_argument("--method", choices=["values", "copy"], default="values",
+                        help="execute_values multi-row INSERT or COPY FROM STDIN")
+    parser.add_argument("--refresh-interval", type=float, default=5.0,
+                        help="seconds between polls for parent keys inserted by other processes")
+    parser.add_argument("--writers", type=int, default=1,
+                        help="generator processes inserting into the same tables, including this one; "
+                             "sizes how far below the newest key the pools look for late commits")
+    parser.add_argument("--duration", type=float, default=0, help="stop after N seconds (default: until Ctrl+C)")
+    args = parser.parse_args()
+
+    try:
+        rates = parse_rates(args.rate) if args.rate else {'appointments': 100.0, 'treatments': 100.0}
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    conn = connect()
+    parents = sorted({p for t in rates for p in TABLES[t]['parents']})
+    overlap = overlap_for(allocator_block(args.batch_size), args.commit_size, args.writers)
+    pools = {table: KeyPool(table, overlap).load(conn) for table in parents}
+    conn.close()
+
+    for table in rates:
+        empty = [p for p in TABLES[table]['parents'] if len(pools[p]) == 0]
+        if empty:
+            raise SystemExit(f"Cannot generate {table}: no rows in {', '.join(empty)}")
+
+    stop = threading.Event()
+    refresher = PoolRefresher(list(pools.values()), connect, args.refresh_interval, stop, overlap)
+    refresher.start()
+    workers = [TableWorker(t, r, pools, args.batch_size, args.commit_size, args.method, stop)
+               for t, r in rates.items()]
+    for w in workers:
+        w.start()
+    print(f"Generating {', '.join(f'{t} at {r:g} rows/s' for t, r in rates.items())}. Stop with Ctrl+C.")
+
+    start = time.monotonic()
+    last = {w.table: 0 for w in workers}
+    try:
+        while any(w.is_alive() for w in workers):
+            time.sleep(5)
+            elapsed = time.monotonic() - start
+            print(" | ".join(f"{w.table}: {w.inserted} rows ({(w.inserted - last[w.table]) / 5:,.0f}/s)"
+                             for w in workers) + f"  [{elapsed:.0f}s]")
+            last = {w.table: w.inserted for w in workers}
+            if args.duration and elapsed >= args.duration:
+                break
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    for w in workers:
+        w.join()
+    refresher.join()
+    elapsed = time.monotonic() - start
+    for w in workers:
+        print(f"{w.table}: {w.inserted} rows in {elapsed:.1f}s ({w.inserted / elapsed:,.0f} rows/s), "
+              f"{w.errors} failed batches ({w.failed_rows} rows not inserted)")
+    print(", ".join(f"{t} pool: {len(p)} keys" for t, p in pools.items()))
+    print("Generator stopped.")
@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Step:
+    # One unit of work in the load graph: runs func() once all steps named in deps succeeded
+    def __init__(self, name, func, deps=(), retries=2, retry_delay=1.0):
+        self.name = name
+        self.func = func
+        self.deps = set(deps)
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.status = "pending"  # pending -> running -> done | failed | skipped
+        self.attempts = 0
+        self.elapsed = 0.0
+        self.error = None
+
+
+def _run_step(step):
+    # Each attempt runs in its own transaction inside func, so a retry starts clean
+    start = time.perf_counter()
+    while True:
+        step.attempts += 1
+        try:
+            step.func()
+            step.error = None
+            return True
+        except Exception as e:
+            step.error = e
+            if step.attempts > step.retries:
+                return False
+            print(f"  [{step.name}] attempt {step.attempts} failed: {e} -- retrying")
+            time.sleep(step.retry_delay)
+        finally:
+            step.elapsed = time.perf_counter() - start
+
+
+def run_steps(steps, workers=4):
+    by_name = {s.name: s for s in steps}
+    for s in steps:
+        missing = s.deps - by_name.keys()
+        if missing:
+            raise ValueError(f"Step '{s.name}' depends on unknown steps: {sorted(missing)}")
+
+    start = time.perf_counter()
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # Skip everything downstream of a failure, then submit whatever is unblocked
+            for s in steps:
+                if s.status != "pending":
+                    continue
+                dep_states = {by_name[d].status for d in s.deps}
+                if dep_states & {"failed", "skipped"}:
+                    s.status = "skipped"
+                    print(f"[{s.name}] skipped (dependency failed)")
+                elif dep_states <= {"done"}:
+                    s.status = "running"
+                    running[pool.submit(_run_step, s)] = s
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                s = running.pop(future)
+                if future.result():
+                    s.status = "done"
+                    print(f"[{s.name}] done in {s.elapsed:.2f}s")
+                else:
+                    s.status = "failed"
+                    print(f"[{s.name}] FAILED after {s.attempts} attempt(s): {s.error}")
+
+    total = time.perf_counter() - start
+    print_summary(steps, total)
+    return all(s.status == "done" for s in steps)
+
+
+def print_summary(steps, total):
+    print("\n--- Load summary ---")
+    print(f"{'step':<32} {'status':<8} {'tries':>5} {'seconds':>9}")
+    for s in steps:
+        print(f"{s.name:<32} {s.status:<8} {s.attempts:>5} {s.elapsed:>9.2f}")
+    print(f"Total wall time: {total:.2f}s")
@@ -1,13 +1,28 @@
+import argparse
+import csv
+import hashlib
+import io
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+
+from db import get_engine
+from id_allocator import normalize_id_column, sync_all_sequences
+from load_scheduler import Step, run_steps
+from schema import column_types, foreign_keys, key_columns, primary_keys
+
+# Rows per COPY batch in --mode copy; memory use is bounded by this, not by the file size
+CHUNK_SIZE = 50000
 
-DB_USER = 'postgres'
-DB_PASSWORD = '123456789'
-DB_HOST = 'localhost'
-DB_PORT = '5432'
-DB_NAME = 'hospital_db'
+# Checksums of the CSVs applied by --mode incremental; unchanged files are skipped on the next run
+MANIFEST_FILE = 'load_manifest.json'
 
-engine = create_engine(f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}')
+engine = get_engine()
 
 csv_files = {
     'patients': r'D:\User\Documents\visual\data\patients.csv',
@@ -23,37 +38,314 @@ column_mappings = {
     'billing': {'patientID': 'patient_id', 'treatmentID': 'treatment_id'}  # Adjust if column names differ
 }
 
-for table_name, file_path in csv_files.items():
+
+def load_with_to_sql(table_name, file_path):
+    df = pd.read_csv(file_path)
+    print(f"Columns in {table_name}.csv: {list(df.columns)}")
+    if table_name in column_mappings:
+        df = df.rename(columns=column_mappings[table_name])
+    df = normalize_keys(table_name, df)
+    df.to_sql(table_name, engine, if_exists='replace', index=False, dtype=column_types.get(table_name))
+    print(f"Successfully loaded {file_path} into table '{table_name}'")
+
+
+def prepare_chunk(table_name, chunk):
+    if table_name in column_mappings:
+        chunk = chunk.rename(columns=column_mappings[table_name])
+    return normalize_keys(table_name, chunk)
+
+
+def load_with_copy(table_name, file_path, chunksize=CHUNK_SIZE):
+    # Stream the CSV in fixed-size chunks through COPY FROM STDIN.
+    # The table is (re)created before any rows are read into it: column_types for the columns it
+    # lists, the first chunk's dtypes for the rest, and TEXT for those when the file has no rows.
+    # Every chunk is then serialized back to CSV in memory and copied in. Columns created as
+    # integers go through pandas' nullable Int64, since a later chunk with an empty value reads
+    # them as floats ("3.0"), which COPY would reject.
+    start = time.perf_counter()
+    total_rows = 0
+    reader = pd.read_csv(file_path, chunksize=chunksize)
+    first = next(reader, None)
+    if first is None:
+        # Older pandas yields no chunk at all for a header-only file
+        first = pd.read_csv(file_path, nrows=0, dtype=str)
+    first = prepare_chunk(table_name, first)
+    print(f"Columns in {table_name}.csv: {list(first.columns)}")
+    typed = column_types.get(table_name, {})
+    first.head(0).to_sql(table_name, engine, if_exists='replace', index=False, dtype=typed)
+    integer_columns = [c for c in first.columns if c not in typed and pd.api.types.is_integer_dtype(first[c])]
+    columns = ", ".join(f'"{c}"' for c in first.columns)
+    copy_sql = f'COPY "{table_name}" ({columns}) FROM STDIN WITH (FORMAT csv)'
+
+    raw = engine.raw_connection()
     try:
-        df = pd.read_csv(file_path)
-        print(f"Columns in {table_name}.csv: {list(df.columns)}")
-        if table_name in column_mappings:
-            df = df.rename(columns=column_mappings[table_name])
-        df.to_sql(table_name, engine, if_exists='replace', index=False)
-        print(f"Successfully loaded {file_path} into table '{table_name}'")
-    except Exception as e:
-        print(f"Error loading {file_path}: {e}")
+        cur = raw.cursor()
+        chunks = (prepare_chunk(table_name, chunk) for chunk in reader)
+        for chunk in itertools.chain([first], chunks):
+            if chunk.empty:
+                continue
+            for column in integer_columns:
+                chunk[column] = chunk[column].astype('Int64')
+            buf = io.StringIO()
+            chunk.to_csv(buf, index=False, header=False, quoting=csv.QUOTE_MINIMAL)
+            buf.seek(0)
+            cur.copy_expert(copy_sql, buf)
+            total_rows += len(chunk)
+        raw.commit()
+        cur.close()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    elapsed = time.perf_counter() - start
+    rate = total_rows / elapsed if elapsed > 0 else 0.0
+    print(f"Successfully copied {total_rows} rows from {file_path} into table '{table_name}' "
+          f"in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+    return total_rows, elapsed
+
 
-with engine.connect() as connection:
+def normalize_keys(table_name, df):
+    # Keys are stored zero-padded to a fixed width so they sort correctly (see id_allocator.py)
+    for column in key_columns.get(table_name, []):
+        if column in df.columns:
+            df[column] = normalize_id_column(df[column])
+    return df
+
+
+def sync_id_sequences():
+    # Moves the id sequences used by the generators past the keys that were just loaded
+    raw = engine.raw_connection()
     try:
-        connection.execute(text("""
-            ALTER TABLE patients ADD PRIMARY KEY (patient_id);
-            ALTER TABLE doctors ADD PRIMARY KEY (doctor_id);
-            ALTER TABLE appointments ADD PRIMARY KEY (appointment_id);
-            ALTER TABLE appointments ADD CONSTRAINT fk_patient 
-                FOREIGN KEY (patient_id) REFERENCES patients(patient_id);
-            ALTER TABLE appointments ADD CONSTRAINT fk_doctor 
-                FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id);
-            ALTER TABLE treatments ADD PRIMARY KEY (treatment_id);
-            ALTER TABLE treatments ADD CONSTRAINT fk_appointment 
-                FOREIGN KEY (appointment_id) REFERENCES appointments(appointment_id);
-            ALTER TABLE billing ADD PRIMARY KEY (bill_id);
-            ALTER TABLE billing ADD CONSTRAINT fk_patient 
-                FOREIGN KEY (patient_id) REFERENCES patients(patient_id);
-            ALTER TABLE billing ADD CONSTRAINT fk_treatment 
-                FOREIGN KEY (treatment_id) REFERENCES treatments(treatment_id);
-        """))
-        connection.commit()
-        print("Successfully applied constraints")
+        sync_all_sequences(raw)
     except Exception as e:
-        print(f"Error applying constraints: {e}")
\ No newline at end of file
+        print(f"Error syncing id sequences: {e}")
+    finally:
+        raw.close()
+
+
+def add_primary_key(table_name):
+    # engine.begin() commits on success and rolls back on error, so each statement stands alone
+    with engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {table_name} ADD PRIMARY KEY ({primary_keys[table_name]})"))
+
+
+def add_foreign_key(table_name, constraint, column, ref_table, ref_column):
+    with engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {table_name} ADD CONSTRAINT {constraint} "
+                                f"FOREIGN KEY ({column}) REFERENCES {ref_table}({ref_column})"))
+
+
+def apply_constraints():
+    for table_name in primary_keys:
+        try:
+            add_primary_key(table_name)
+            print(f"Added primary key on {table_name}")
+        except Exception as e:
+            print(f"Error adding primary key on {table_name}: {e}")
+    for fk in foreign_keys:
+        try:
+            add_foreign_key(*fk)
+            print(f"Added {fk[1]} on {fk[0]}")
+        except Exception as e:
+            print(f"Error adding {fk[1]} on {fk[0]}: {e}")
+
+
+def build_load_steps(load_table, retries=2):
+    # load:* steps have no dependencies and run side by side; pk:* waits for its own table;
+    # fk:* waits for the primary keys on both ends, which walks
+    # patients/doctors -> appointments -> treatments -> billing
+    steps = []
+    for table_name, file_path in csv_files.items():
+        steps.append(Step(f"load:{table_name}",
+                          lambda t=table_name, f=file_path: load_table(t, f),
+                          retries=retries))
+    for table_name in primary_keys:
+        steps.append(Step(f"pk:{table_name}",
+                          lambda t=table_name: add_primary_key(t),
+                          deps=[f"load:{table_name}"], retries=retries))
+    for fk in foreign_keys:
+        table_name, constraint, _, ref_table, _ = fk
+        steps.append(Step(f"fk:{table_name}.{constraint}",
+                          lambda fk=fk: add_foreign_key(*fk),
+                          deps=[f"pk:{table_name}", f"pk:{ref_table}"], retries=retries))
+    return steps
+
+
+# Parents before children, so upserted rows never point at keys that are not there yet
+load_order = ['patients', 'doctors', 'appointments', 'treatments', 'billing']
+
+
+def file_checksum(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(path=MANIFEST_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, path=MANIFEST_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def table_exists(table_name):
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT to_regclass(:t)"), {"t": table_name}).scalar() is not None
+
+
+def upsert_from_csv(table_name, file_path, chunksize=CHUNK_SIZE):
+    # Each chunk is copied into a temp staging table shaped like the target, then merged with
+    # INSERT ... ON CONFLICT DO UPDATE. The WHERE on the update skips rows whose values did not
+    # change, so only new or modified rows are written. Everything commits together at the end,
+    # so dashboards keep reading the previous rows until the new ones are visible.
+    # ON CONFLICT cannot touch the same row twice in one statement, so a key repeated within
+    # a chunk is merged once, from its last line in the file (the highest ctid in the freshly
+    # truncated staging table).
+    key = primary_keys[table_name]
+    stage = f"stage_{table_name}"
+    start = time.perf_counter()
+    inserted = updated = seen = duplicates = 0
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table_name,))
+        if (cur.fetchone() or (False,))[0]:
+            # index_advisor.py --partition makes the key (id, date), so ON CONFLICT ({key}) has no unique index
+            raise ValueError(f"{table_name} is partitioned by year; --mode incremental cannot upsert into it, "
+                             f"use --mode replace or copy")
+        cur.execute(f"CREATE TEMP TABLE {stage} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP")
+        merge_sql = None
+        for chunk in pd.read_csv(file_path, chunksize=chunksize):
+            chunk = prepare_chunk(table_name, chunk)
+            if merge_sql is None:
+                cols = [f'"{c}"' for c in chunk.columns]
+                other = [c for c, name in zip(cols, chunk.columns) if name != key]
+                copy_sql = f"COPY {stage} ({', '.join(cols)}) FROM STDIN WITH (FORMAT csv)"
+                merge_sql = (
+                    f"INSERT INTO {table_name} ({', '.join(cols)}) "
+                    f"SELECT DISTINCT ON ({key}) {', '.join(cols)} FROM {stage} ORDER BY {key}, ctid DESC "
+                    f"ON CONFLICT ({key}) DO UPDATE SET {', '.join(f'{c} = EXCLUDED.{c}' for c in other)} "
+                    f"WHERE ({', '.join(f'{table_name}.{c}' for c in other)}) "
+                    f"IS DISTINCT FROM ({', '.join(f'EXCLUDED.{c}' for c in other)}) "
+                    f"RETURNING (xmax = 0) AS inserted"
+                )
+            buf = io.StringIO()
+            chunk.to_csv(buf, index=False, header=False, quoting=csv.QUOTE_MINIMAL)
+            buf.seek(0)
+            cur.copy_expert(copy_sql, buf)
+            cur.execute(merge_sql)
+            flags = [row[0] for row in cur.fetchall()]
+            inserted += sum(flags)
+            updated += len(flags) - sum(flags)
+            seen += len(chunk)
+            duplicates += int(chunk[key].duplicated().sum())
+            cur.execute(f"TRUNCATE {stage}")
+        raw.commit()
+        cur.close()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Upserted {table_name}: {seen} rows read, {inserted} inserted, {updated} updated, "
+          f"{seen - duplicates - inserted - updated} unchanged, {duplicates} duplicate keys skipped "
+          f"in {elapsed:.2f}s")
+    return inserted, updated
+
+
+def load_incremental(chunksize=CHUNK_SIZE, force=False):
+    manifest = read_manifest()
+    created = set()
+    for table_name in load_order:
+        file_path = csv_files[table_name]
+        try:
+            checksum = file_checksum(file_path)
+            entry = manifest.get(table_name)
+            if not force and entry and entry.get('sha256') == checksum and table_exists(table_name):
+                print(f"Skipping {table_name}: {file_path} unchanged since {entry.get('loaded_at')}")
+                continue
+            if table_exists(table_name):
+                upsert_from_csv(table_name, file_path, chunksize)
+            else:
+                # First run: nothing to merge into, so do a plain bulk load and key it
+                load_with_copy(table_name, file_path, chunksize)
+                add_primary_key(table_name)
+                created.add(table_name)
+            manifest[table_name] = {
+                'path': file_path,
+                'sha256': checksum,
+                'loaded_at': datetime.now().isoformat(timespec='seconds')
+            }
+            write_manifest(manifest)
+        except Exception as e:
+            print(f"Error loading {file_path} incrementally: {e}")
+
+    for fk in foreign_keys:
+        if fk[0] in created:
+            try:
+                add_foreign_key(*fk)
+                print(f"Added {fk[1]} on {fk[0]}")
+            except Exception as e:
+                print(f"Error adding {fk[1]} on {fk[0]}: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load hospital CSV files into PostgreSQL")
+    parser.add_argument("--mode", choices=["replace", "copy", "incremental"], default="replace",
+                        help="replace: pandas to_sql (default); copy: stream CSV chunks through COPY FROM STDIN; "
+                             "incremental: upsert new/changed rows into the existing tables")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE,
+                        help="rows per COPY batch in copy mode")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="run loads and constraint steps on a pool of this many workers")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="times a failed step is retried on its own (with --workers)")
+    parser.add_argument("--force", action="store_true",
+                        help="in incremental mode, reload files even if their checksum is unchanged")
+    parser.add_argument("--data-dir",
+                        help="load <dir>/<table>.csv instead of the paths in csv_files (e.g. output of data_scaler.py)")
+    args = parser.parse_args()
+
+    if args.data_dir:
+        csv_files = {table_name: os.path.join(args.data_dir, f"{table_name}.csv") for table_name in csv_files}
+
+    if args.mode == "incremental":
+        # Tables, keys and foreign keys stay in place; only rows move
+        load_incremental(args.chunksize, args.force)
+        sync_id_sequences()
+        raise SystemExit(0)
+
+    if args.mode == "copy":
+        def load_table(table_name, file_path):
+            load_with_copy(table_name, file_path, args.chunksize)
+    else:
+        load_table = load_with_to_sql
+
+    if args.workers > 1:
+        engine.dispose()
+        engine = get_engine(pool_size=args.workers, max_overflow=args.workers)
+        ok = run_steps(build_load_steps(load_table, args.retries), workers=args.workers)
+        sync_id_sequences()
+        raise SystemExit(0 if ok else 1)
+
+    for table_name, file_path in csv_files.items():
+        try:
+            load_table(table_name, file_path)
+        except Exception as e:
+            print(f"Error loading {file_path}: {e}")
+
+    apply_constraints()
+    sync_id_sequences()
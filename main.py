@@ -1,36 +1,137 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
 import psycopg2
 
-conn = psycopg2.connect(
-    dbname="hospital_db",
-    user="postgres",
-    password="123456789",
-    host="localhost",
-    port="5432"
-)
+from db import connection_pool
+from query_pack import read_queries
+
+READ_PREFIXES = ("select", "with", "values", "table")
+
+
+def is_read_query(sql):
+    return sql.lstrip().lower().startswith(READ_PREFIXES)
+
 
-cursor = conn.cursor()
-with open("queries.sql", "r", encoding="utf-8") as f:
-    sql_script = f.read()
+def planner_estimate(cur, sql):
+    # Plain EXPLAIN only plans the query, so this is cheap
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+    plan = cur.fetchone()[0][0]["Plan"]
+    return plan["Total Cost"], plan["Plan Rows"]
 
-queries = [q.strip() for q in sql_script.split(";") if q.strip()]
 
-for i, query in enumerate(queries, start=1):
-    print(f"\n--- Results for Query {i} ---")
+def run_query(pool, index, query, show_rows):
+    result = {"index": index, "name": query["name"], "wall_ms": None, "rows": None,
+              "total_cost": None, "plan_rows": None, "columns": [], "preview": [], "error": None}
+    conn = pool.getconn()
     try:
-        cursor.execute(query)
-        try:
-            rows = cursor.fetchall()
-            if rows:
-                colnames = [desc[0] for desc in cursor.description]
-                print(f"Columns: {colnames}")
-                for row in rows[:10]:
-                    print(row)
-            else:
-                print("No data returned")
-        except psycopg2.ProgrammingError as e:
-            print(f"No data to display: {e}")
+        if is_read_query(query["sql"]):
+            with conn.cursor() as cur:
+                result["total_cost"], result["plan_rows"] = planner_estimate(cur, query["sql"])
+            start = time.perf_counter()
+            # Named (server-side) cursor: only the preview rows cross the wire, the rest
+            # are counted on the server with MOVE
+            with conn.cursor(name=f"q{index}") as cur:
+                cur.itersize = show_rows
+                cur.execute(query["sql"])
+                result["preview"] = cur.fetchmany(show_rows)
+                result["columns"] = [desc[0] for desc in cur.description] if cur.description else []
+                with conn.cursor() as mover:
+                    mover.execute(f'MOVE FORWARD ALL IN "q{index}"')
+                    result["rows"] = len(result["preview"]) + mover.rowcount
+            result["wall_ms"] = (time.perf_counter() - start) * 1000
+            conn.rollback()
+        else:
+            start = time.perf_counter()
+            with conn.cursor() as cur:
+                cur.execute(query["sql"])
+                result["rows"] = cur.rowcount
+            conn.commit()
+            result["wall_ms"] = (time.perf_counter() - start) * 1000
     except Exception as e:
-        print(f"Error executing query {i}: {e}")
+        conn.rollback()
+        result["error"] = str(e).strip()
+    finally:
+        pool.putconn(conn)
+    return result
+
+
+def run_pack(queries, workers, show_rows):
+    # Consecutive read queries are independent and run together on the pool;
+    # anything that writes runs alone, in file order
+    pool = connection_pool(workers)
+    results = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            batch = []
+            for i, query in enumerate(queries, start=1):
+                if is_read_query(query["sql"]):
+                    batch.append(executor.submit(run_query, pool, i, query, show_rows))
+                    continue
+                results.extend(f.result() for f in batch)
+                batch = []
+                results.append(run_query(pool, i, query, show_rows))
+            results.extend(f.result() for f in batch)
+    finally:
+        pool.closeall()
+    return results
+
+
+def print_result(r):
+    print(f"\n--- Results for Query {r['index']}: {r['name']} ---")
+    if r["error"]:
+        print(f"Error executing query {r['index']}: {r['error']}")
+        return
+    if r["preview"]:
+        print(f"Columns: {r['columns']}")
+        for row in r["preview"]:
+            print(row)
+    else:
+        print("No data returned")
+    cost = f", planner cost {r['total_cost']:.1f}" if r["total_cost"] is not None else ""
+    print(f"({r['rows']} rows in {r['wall_ms']:.1f} ms{cost})")
+
+
+def write_report(results, path, wall_ms):
+    fields = ["index", "name", "wall_ms", "rows", "total_cost", "plan_rows", "error"]
+    records = [{k: r[k] for k in fields} for r in results]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.lower().endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"run_at": datetime.now().isoformat(timespec="seconds"),
+                       "total_wall_ms": wall_ms, "queries": records}, f, indent=2)
+    print(f"Report written to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a SQL query pack against hospital_db")
+    parser.add_argument("--file", default="queries.sql", help="query pack to run")
+    parser.add_argument("--workers", type=int, default=4, help="queries run in parallel")
+    parser.add_argument("--rows", type=int, default=10, help="rows to fetch and print per query")
+    parser.add_argument("--report", help="write per-query timings to this .json or .csv file")
+    args = parser.parse_args()
+
+    queries = read_queries(args.file)
+    start = time.perf_counter()
+    try:
+        results = run_pack(queries, args.workers, args.rows)
+    except psycopg2.OperationalError as e:
+        raise SystemExit(f"Could not connect to the database: {e}")
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    for r in results:
+        print_result(r)
+    print(f"\nRan {len(results)} queries in {wall_ms:.1f} ms with {args.workers} workers")
 
-cursor.close()
-conn.close()
\ No newline at end of file
+    if args.report:
+        write_report(results, args.report, wall_ms)
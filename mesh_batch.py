@@ -0,0 +1,211 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from mesh_cache import MESH_CACHE_DIR
+from mesh_pipeline import DEFAULT_PARAMS, resolve_params, run_pipeline
+
+# Runs the mesh_pipeline.py stages over every .obj file under one or more directories.
+#
+# Models are spread over a process pool, with at most two per worker in flight. Each
+# worker caps its address space at --max-memory-mb, so one oversized scan fails with a
+# MemoryError instead of pushing the machine into swap. If a worker dies outright, the
+# pool is rebuilt and every model that was in flight is retried on its own, so the one
+# that kills the worker can be told apart. A model that kills a worker twice while
+# running alone is recorded as failed.
+#
+# One JSON line per model is appended to the report as soon as the model finishes:
+# counts, extreme points and per-stage timings. On start the report is read back, and
+# models already processed with the same parameters and an unchanged file (size and
+# mtime) are skipped. An interrupted batch therefore resumes where it stopped; failed
+# models are tried again.
+
+REPORT_FILE = "exports/mesh_batch.jsonl"
+# Times a model running alone may kill its worker before it is recorded as failed
+MAX_CRASHES = 2
+# Open3D wraps its error messages in terminal color codes
+ANSI_CODES = re.compile(r'\x1b\[[0-9;]*m')
+
+
+def find_models(paths):
+    models = []
+    for path in paths:
+        if os.path.isfile(path):
+            models.append(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            models.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith('.obj'))
+    return models
+
+
+def params_key(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def read_done(report_path, key):
+    # model path -> file stamp of every model the report has a successful line for
+    done = {}
+    if not os.path.exists(report_path):
+        return done
+    with open(report_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # The last line of a report cut off by a crash
+                continue
+            if record.get('status') == 'ok' and record.get('params_key') == key:
+                done[record['model']] = (record['size'], record['mtime_ns'])
+    return done
+
+
+def limit_memory(max_bytes):
+    # Worker initializer; RLIMIT_AS is not available on Windows, where the cap is skipped
+    try:
+        import resource
+    except ImportError:
+        return
+    if max_bytes > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+
+
+def worker_peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def process_model(path, params, cache_dir, mesh_cache_dir):
+    # Runs in a worker; never raises, so one bad model does not take the batch down
+    record = {'model': path, **file_stamp(path), 'params_key': params_key(params), 'pid': os.getpid()}
+    stages = {}
+
+    def on_stage(stage, state, timing):
+        stages[stage.name] = dict(stage.stats(state), seconds=round(timing['seconds'], 4), cached=timing['cached'])
+
+    start = time.perf_counter()
+    try:
+        run_pipeline(path, params, cache_dir, on_stage=on_stage, mesh_cache_dir=mesh_cache_dir)
+        record['status'], record['error'] = 'ok', None
+    except MemoryError:
+        record['status'], record['error'] = 'failed', 'out of memory (worker limit)'
+    except Exception as e:
+        message = ' '.join(ANSI_CODES.sub('', str(e)).split())
+        record['status'], record['error'] = 'failed', f"{type(e).__name__}: {message}"
+    record['seconds'] = round(time.perf_counter() - start, 4)
+    record['peak_rss'] = worker_peak_rss()
+    record['stages'] = stages
+    return record
+
+
+def run_batch(models, params, report_path, workers, max_memory_bytes, cache_dir=None,
+              mesh_cache_dir=MESH_CACHE_DIR, worker=process_model):
+    # worker(path, params, cache_dir, mesh_cache_dir) -> record; process_model unless replaced in tests
+    params = resolve_params(params)
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+    counts = {'ok': 0, 'failed': 0}
+    crashes = {}
+    # Models that were in flight when a worker died; they run alone until they finish
+    solo = set()
+    queue = list(models)
+    queue.reverse()
+    start = time.perf_counter()
+
+    with open(report_path, 'a', encoding='utf-8') as report:
+        def write(record):
+            record['finished_at'] = datetime.now().isoformat(timespec='seconds')
+            report.write(json.dumps(record, default=str) + '\n')
+            report.flush()
+            counts[record['status']] += 1
+            done = counts['ok'] + counts['failed']
+            if record['status'] != 'ok' or done % 50 == 0 or done == len(models):
+                elapsed = time.perf_counter() - start
+                print(f"{done}/{len(models)} models ({done / elapsed:.2f}/s), {counts['failed']} failed"
+                      + (f" -- {record['model']}: {record['error']}" if record['status'] != 'ok' else ""))
+
+        while queue:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=limit_memory, initargs=(max_memory_bytes,))
+            in_flight = {}
+            try:
+                while queue or in_flight:
+                    while queue and len(in_flight) < workers * 2:
+                        if in_flight and (queue[-1] in solo or any(p in solo for p in in_flight.values())):
+                            break
+                        # Taken off the queue only once the pool has accepted it
+                        in_flight[pool.submit(worker, queue[-1], params, cache_dir, mesh_cache_dir)] = queue[-1]
+                        queue.pop()
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        # Stays in flight until its record is written, so a broken pool retries it
+                        write(future.result())
+                        del in_flight[future]
+            except BrokenProcessPool:
+                # A worker died (e.g. killed by the OOM killer); finished results are kept, the rest is lost
+                lost = []
+                for future, path in in_flight.items():
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        write(future.result())
+                    else:
+                        lost.append(path)
+                for path in lost:
+                    if len(lost) > 1:
+                        # Any of them may have killed the worker: each is retried on its own
+                        solo.add(path)
+                        queue.append(path)
+                        continue
+                    crashes[path] = crashes.get(path, 0) + 1
+                    if crashes[path] >= MAX_CRASHES:
+                        write({'model': path, **file_stamp(path), 'params_key': params_key(params), 'status': 'failed',
+                               'error': 'worker process died', 'stages': {}})
+                    else:
+                        queue.append(path)
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the mesh pipeline over directories of .obj models")
+    parser.add_argument("paths", nargs="+", help="directories (searched recursively) or .obj files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="worker processes")
+    parser.add_argument("--max-memory-mb", type=int, default=4096,
+                        help="address space limit per worker, 0 = no limit")
+    parser.add_argument("--report", default=REPORT_FILE, help="JSONL file the per-model results are appended to")
+    parser.add_argument("--restart", action="store_true", help="ignore the existing report and process every model")
+    parser.add_argument("--cache-dir", help="cache stage results here (off by default: one entry per model and stage)")
+    parser.add_argument("--no-mesh-cache", action="store_true",
+                        help="parse every model instead of keeping a binary copy in " + MESH_CACHE_DIR)
+    for name, default in DEFAULT_PARAMS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=type(default), default=default,
+                            help=f"default: {default}")
+    args = parser.parse_args()
+
+    params = resolve_params({name: getattr(args, name) for name in DEFAULT_PARAMS})
+    models = find_models(args.paths)
+    if args.restart and os.path.exists(args.report):
+        os.remove(args.report)
+    done = read_done(args.report, params_key(params))
+    todo = [m for m in models if done.get(m) != tuple(file_stamp(m).values())]
+    print(f"{len(models)} models found, {len(models) - len(todo)} already done, {len(todo)} to process")
+
+    start = time.perf_counter()
+    counts = run_batch(todo, params, args.report, args.workers, args.max_memory_mb * 1024 * 1024, args.cache_dir,
+                       None if args.no_mesh_cache else MESH_CACHE_DIR)
+    print(f"Processed {len(todo)} models in {time.perf_counter() - start:.1f}s: "
+          f"{counts['ok']} ok, {counts['failed']} failed. Report: {args.report}")
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import open3d as o3d
+
+# Binary cache for .obj models, so a model's text is parsed only once.
+#
+# The first load parses the file with Open3D, computes vertex normals if the file has
+# none, and writes vertices/normals/colors as float32 and triangles as int32, one .npy
+# file each, to <cache_dir>/<hash of the absolute path>/. Later loads map those files
+# copy-on-write (mmap_mode='c'): only the pages that are touched are read, and writes to
+# the arrays stay private to the process instead of changing the cache.
+#
+# An entry is used while the source's size and mtime match meta.json. When they differ,
+# the source is hashed: the same SHA-256 (e.g. after a touch or a copy) only refreshes
+# meta.json, while a different one rebuilds the entry. verify=True always hashes.
+#
+# load_tensor_mesh() wraps the mapped arrays in an open3d.t TriangleMesh without copying.
+# The legacy TriangleMesh used by mesh_pipeline.py keeps its own float64 vectors, so
+# load_mesh() has to copy, and it converts with NumPy first. That matters: Vector3dVector
+# copies float32 input element by element, more than 100x slower than float64 input.
+
+MESH_CACHE_DIR = os.path.join(".mesh_cache", "meshes")
+META_FILE = "meta.json"
+ARRAYS = {'vertices': np.float32, 'triangles': np.int32, 'normals': np.float32, 'colors': np.float32}
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def entry_dir(source, cache_dir=MESH_CACHE_DIR):
+    key = hashlib.sha256(os.path.abspath(source).encode('utf-8')).hexdigest()[:24]
+    return os.path.join(cache_dir, key)
+
+
+def read_meta(entry):
+    path = os.path.join(entry, META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_meta(entry, meta):
+    # Written last and atomically: an entry without meta.json is treated as missing
+    tmp_path = os.path.join(entry, META_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(entry, META_FILE))
+
+
+def build_entry(source, entry, stamp, digest):
+    os.makedirs(entry, exist_ok=True)
+    meta_path = os.path.join(entry, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    mesh = o3d.io.read_triangle_mesh(source)
+    if not mesh.has_vertex_normals():
+        mesh.compute_vertex_normals()
+    arrays = {'vertices': mesh.vertices, 'triangles': mesh.triangles,
+              'normals': mesh.vertex_normals, 'colors': mesh.vertex_colors}
+    for name, dtype in ARRAYS.items():
+        np.save(os.path.join(entry, f"{name}.npy"), np.ascontiguousarray(np.asarray(arrays[name]), dtype=dtype))
+    meta = dict(source=os.path.abspath(source), sha256=digest, **stamp,
+                vertices=len(mesh.vertices), triangles=len(mesh.triangles))
+    write_meta(entry, meta)
+    return meta
+
+
+def ensure_entry(source, cache_dir=MESH_CACHE_DIR, verify=False):
+    # Returns (entry directory, meta), rebuilding the entry if the source changed
+    entry = entry_dir(source, cache_dir)
+    meta = read_meta(entry)
+    stamp = file_stamp(source)
+    unchanged = meta is not None and all(meta.get(k) == v for k, v in stamp.items())
+    if unchanged and not verify:
+        return entry, meta
+    digest = file_hash(source)
+    if meta is not None and meta.get('sha256') == digest:
+        if not unchanged:
+            meta.update(stamp)
+            write_meta(entry, meta)
+        return entry, meta
+    return entry, build_entry(source, entry, stamp, digest)
+
+
+def source_hash(source, cache_dir=MESH_CACHE_DIR):
+    # SHA-256 of the source, from meta.json while the file is unchanged; cache_dir=None hashes the file
+    if cache_dir is None:
+        return file_hash(source)
+    return ensure_entry(source, cache_dir)[1]['sha256']
+
+
+def load_arrays(source, cache_dir=MESH_CACHE_DIR, verify=False):
+    entry, _ = ensure_entry(source, cache_dir, verify)
+    return {name: np.load(os.path.join(entry, f"{name}.npy"), mmap_mode='c') for name in ARRAYS}
+
+
+def load_tensor_mesh(source, cache_dir=MESH_CACHE_DIR, verify=False):
+    # Positions, triangles and normals share memory with the mapped files
+    arrays = load_arrays(source, cache_dir, verify)
+    mesh = o3d.t.geometry.TriangleMesh()
+    mesh.vertex.positions = o3d.core.Tensor.from_numpy(arrays['vertices'])
+    mesh.triangle.indices = o3d.core.Tensor.from_numpy(arrays['triangles'])
+    mesh.vertex.normals = o3d.core.Tensor.from_numpy(arrays['normals'])
+    if len(arrays['colors']):
+        mesh.vertex.colors = o3d.core.Tensor.from_numpy(arrays['colors'])
+    return mesh
+
+
+def load_mesh(source, cache_dir=MESH_CACHE_DIR, verify=False):
+    # Legacy TriangleMesh with vertex normals; cache_dir=None parses the file directly
+    if cache_dir is None:
+        mesh = o3d.io.read_triangle_mesh(source)
+        if not mesh.has_vertex_normals():
+            mesh.compute_vertex_normals()
+        return mesh
+    arrays = load_arrays(source, cache_dir, verify)
+    mesh = o3d.geometry.TriangleMesh(o3d.utility.Vector3dVector(arrays['vertices'].astype(np.float64)),
+                                     o3d.utility.Vector3iVector(arrays['triangles']))
+    mesh.vertex_normals = o3d.utility.Vector3dVector(arrays['normals'].astype(np.float64))
+    if len(arrays['colors']):
+        mesh.vertex_colors = o3d.utility.Vector3dVector(arrays['colors'].astype(np.float64))
+    return mesh
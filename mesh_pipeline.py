@@ -0,0 +1,332 @@
+import copy
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import open3d as o3d
+
+from mesh_cache import MESH_CACHE_DIR, load_mesh as load_cached_mesh, source_hash
+
+# The Assik5.py mesh processing as a chain of stages:
+#   load -> sample -> normals -> poisson -> density_crop -> voxelize -> clip -> colorize
+#
+# Every stage reads earlier outputs from the pipeline state and adds its own. Its cache
+# key is a hash of its name, the parameters it uses and the keys of the stages it reads
+# (its inputs); load reads the input file, so its key covers the file's hash. Outputs are
+# saved as .npz under <cache_dir>/<stage>/<key>.npz, so a re-run with one changed
+# parameter recomputes only the stage that uses it and the stages that depend on it,
+# e.g. voxel_divisor redoes voxelize alone. The load stage is not stored: the
+# model comes from mesh_cache.py's binary cache instead. Cached outputs are loaded on first use,
+# so a stage that nothing downstream needs is never read back.
+#
+# Bump CACHE_VERSION when a stage changes what it computes, so old entries are ignored.
+
+CACHE_DIR = ".mesh_cache"
+CACHE_VERSION = 4
+
+DEFAULT_PARAMS = {
+    'points': 10000,
+    'seed': 42,
+    'normal_radius': 0.1,
+    'normal_max_nn': 30,
+    'poisson_depth': 9,
+    'density_quantile': 0.01,
+    # voxel size = largest bounding box side / voxel_divisor
+    'voxel_divisor': 20,
+    # 0/1/2 = x/y/z; without clip_planes, points below the center along this axis are kept
+    'clip_axis': 0,
+    # Half-spaces "a,b,c,d;..." -- points with a*x + b*y + c*z + d < 0 for every one are kept
+    'clip_planes': '',
+    # crop: cut the density-cropped reconstruction; poisson: reconstruct the kept points again
+    'clip_mode': 'crop',
+}
+CLIP_MODES = ('crop', 'poisson')
+
+
+# --- (de)serialization: every output is stored as plain arrays -------------------------
+
+def to_arrays(value):
+    if isinstance(value, o3d.geometry.TriangleMesh):
+        return 'mesh', {'vertices': np.asarray(value.vertices), 'triangles': np.asarray(value.triangles),
+                        'normals': np.asarray(value.vertex_normals), 'colors': np.asarray(value.vertex_colors)}
+    if isinstance(value, o3d.geometry.PointCloud):
+        return 'pcd', {'points': np.asarray(value.points), 'normals': np.asarray(value.normals),
+                       'colors': np.asarray(value.colors)}
+    if isinstance(value, o3d.geometry.VoxelGrid):
+        voxels = value.get_voxels()
+        return 'voxels', {'voxel_size': np.asarray(value.voxel_size), 'origin': np.asarray(value.origin),
+                          'indices': np.array([v.grid_index for v in voxels], dtype=np.int32).reshape(-1, 3),
+                          'colors': np.array([v.color for v in voxels], dtype=np.float64).reshape(-1, 3)}
+    return 'array', {'value': np.asarray(value)}
+
+
+def from_arrays(kind, arrays):
+    if kind == 'mesh':
+        mesh = o3d.geometry.TriangleMesh(o3d.utility.Vector3dVector(arrays['vertices']),
+                                         o3d.utility.Vector3iVector(arrays['triangles']))
+        if len(arrays['normals']):
+            mesh.vertex_normals = o3d.utility.Vector3dVector(arrays['normals'])
+        if len(arrays['colors']):
+            mesh.vertex_colors = o3d.utility.Vector3dVector(arrays['colors'])
+        return mesh
+    if kind == 'pcd':
+        pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(arrays['points']))
+        if len(arrays['normals']):
+            pcd.normals = o3d.utility.Vector3dVector(arrays['normals'])
+        if len(arrays['colors']):
+            pcd.colors = o3d.utility.Vector3dVector(arrays['colors'])
+        return pcd
+    if kind == 'voxels':
+        grid = o3d.geometry.VoxelGrid()
+        grid.voxel_size = float(arrays['voxel_size'])
+        grid.origin = arrays['origin']
+        for index, color in zip(arrays['indices'], arrays['colors']):
+            grid.add_voxel(o3d.geometry.Voxel(index, color))
+        return grid
+    value = arrays['value']
+    return value.item() if value.ndim == 0 else value
+
+
+def save_outputs(path, outputs):
+    fields = {}
+    kinds = {}
+    for name, value in outputs.items():
+        kinds[name], arrays = to_arrays(value)
+        for field, array in arrays.items():
+            fields[f"{name}.{field}"] = array
+    fields['__kinds__'] = np.array(json.dumps(kinds))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written under a temporary name, so an interrupted run never leaves a truncated entry
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **fields)
+    os.replace(tmp_path, path)
+
+
+def load_outputs(path):
+    with np.load(path) as data:
+        kinds = json.loads(str(data['__kinds__']))
+        outputs = {}
+        for name, kind in kinds.items():
+            prefix = name + '.'
+            arrays = {key[len(prefix):]: data[key] for key in data.files if key.startswith(prefix)}
+            outputs[name] = from_arrays(kind, arrays)
+    return outputs
+
+
+# --- stages ---------------------------------------------------------------------------
+
+def load_mesh(state, p):
+    return {'mesh': load_cached_mesh(state.source, state.mesh_cache_dir)}
+
+
+def sample_points(state, p):
+    o3d.utility.random.seed(p['seed'])
+    return {'pcd': state['mesh'].sample_points_uniformly(number_of_points=p['points'])}
+
+
+def estimate_normals(state, p):
+    # Copy: cached outputs are shared with every later stage
+    pcd = copy.deepcopy(state['pcd'])
+    pcd.estimate_normals(search_param=o3d.geometry.KDTreeSearchParamHybrid(
+        radius=p['normal_radius'], max_nn=p['normal_max_nn']))
+    return {'oriented': pcd}
+
+
+def poisson(state, p):
+    mesh, densities = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(
+        state['oriented'], depth=p['poisson_depth'])
+    return {'poisson': mesh, 'densities': np.asarray(densities)}
+
+
+def remove_low_density(mesh, densities, quantile):
+    if len(densities) > 0:
+        mesh.remove_vertices_by_mask(densities < np.quantile(densities, quantile))
+    return mesh
+
+
+def density_crop(state, p):
+    mesh = remove_low_density(copy.deepcopy(state['poisson']), state['densities'], p['density_quantile'])
+    mesh = mesh.crop(state['pcd'].get_axis_aligned_bounding_box())
+    mesh.compute_vertex_normals()
+    return {'reconstruction': mesh}
+
+
+def voxelize(state, p):
+    pcd = state['pcd']
+    bbox = pcd.get_axis_aligned_bounding_box()
+    max_dimension = (bbox.get_max_bound() - bbox.get_min_bound()).max()
+    voxel_size = max_dimension / p['voxel_divisor']
+    grid = o3d.geometry.VoxelGrid.create_from_point_cloud(pcd, voxel_size)
+    if len(grid.get_voxels()) == 0:
+        # Same fallback as the original script: twice as large voxels
+        voxel_size = max_dimension / (p['voxel_divisor'] / 2)
+        grid = o3d.geometry.VoxelGrid.create_from_point_cloud(pcd, voxel_size)
+    return {'voxels': grid, 'voxel_size': voxel_size}
+
+
+def half_spaces(spec, pcd, axis):
+    # (k, 4) array of [a, b, c, d] rows
+    if not spec.strip():
+        row = np.zeros(4)
+        row[axis] = 1.0
+        row[3] = -pcd.get_axis_aligned_bounding_box().get_center()[axis]
+        return row.reshape(1, 4)
+    rows = [[float(v) for v in part.split(',')] for part in spec.split(';') if part.strip()]
+    if any(len(row) != 4 for row in rows):
+        raise ValueError(f"clip_planes: expected 'a,b,c,d' per half-space, got '{spec}'")
+    return np.array(rows)
+
+
+def inside(points, planes):
+    # One matrix product for all points and half-spaces
+    return np.all(points @ planes[:, :3].T + planes[:, 3] < 0, axis=1)
+
+
+def clip(state, p):
+    # The oriented cloud already has normals (and colors, if any); the kept points take them
+    # along by index instead of estimating them again
+    if p['clip_mode'] not in CLIP_MODES:
+        raise ValueError(f"clip_mode: expected one of {CLIP_MODES}, got '{p['clip_mode']}'")
+    oriented = state['oriented']
+    planes = half_spaces(p['clip_planes'], oriented, p['clip_axis'])
+    keep = np.flatnonzero(inside(np.asarray(oriented.points), planes))
+    if len(keep) == 0:
+        # Nothing for colorize or a second Poisson reconstruction to work with
+        described = ';'.join(','.join(f"{v:g}" for v in row) for row in planes)
+        raise ValueError(f"clip_planes: no points of the model lie inside the half-spaces '{described}'")
+    clipped = oriented.select_by_index(keep)
+
+    if p['clip_mode'] == 'crop':
+        # Vertices outside are dropped with every triangle that uses them
+        mesh = copy.deepcopy(state['reconstruction'])
+        mesh.remove_vertices_by_mask(~inside(np.asarray(mesh.vertices), planes))
+        mesh.remove_unreferenced_vertices()
+    else:
+        mesh, densities = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(
+            clipped, depth=p['poisson_depth'])
+        mesh = remove_low_density(mesh, np.asarray(densities), p['density_quantile'])
+    mesh.compute_vertex_normals()
+    return {'clipped': clipped, 'clipped_mesh': mesh, 'clip_planes': planes}
+
+
+def colorize(state, p):
+    # Blue (low Z) to red (high Z) gradient, plus the points with the smallest and largest Z
+    points = np.asarray(state['clipped'].points)
+    z = points[:, 2]
+    z_normalized = (z - z.min()) / (z.max() - z.min() + 1e-8)
+    colors = np.zeros((len(points), 3))
+    colors[:, 0] = z_normalized
+    colors[:, 2] = 1 - z_normalized
+    colored = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(points))
+    colored.colors = o3d.utility.Vector3dVector(colors)
+    return {'colored': colored, 'z_min_point': points[np.argmin(z)], 'z_max_point': points[np.argmax(z)]}
+
+
+def mesh_stats(mesh):
+    return {'vertices': len(mesh.vertices), 'triangles': len(mesh.triangles)}
+
+
+class Stage:
+    # params: the DEFAULT_PARAMS keys the stage reads; inputs: the stages whose outputs it
+    # reads ('source' = the input file); both go into its cache key.
+    # outputs: the state entries it adds; stats(state) -> dict of numbers for reports;
+    # cache=False for stages that are cheaper to redo than to store
+    def __init__(self, name, title, func, params, inputs, outputs, stats, cache=True):
+        self.name = name
+        self.title = title
+        self.func = func
+        self.params = params
+        self.inputs = inputs
+        self.outputs = outputs
+        self.stats = stats
+        self.cache = cache
+
+
+STAGES = [
+    Stage('load', "Loading", load_mesh, [], ['source'], ['mesh'],
+          lambda s: mesh_stats(s['mesh']), cache=False),
+    Stage('sample', "Conversion to point cloud", sample_points, ['points', 'seed'], ['load'], ['pcd'],
+          lambda s: {'points': len(s['pcd'].points)}),
+    Stage('normals', "Normal estimation", estimate_normals, ['normal_radius', 'normal_max_nn'], ['sample'],
+          ['oriented'], lambda s: {'points': len(s['oriented'].points)}),
+    Stage('poisson', "Poisson reconstruction", poisson, ['poisson_depth'], ['normals'], ['poisson', 'densities'],
+          lambda s: mesh_stats(s['poisson'])),
+    Stage('density_crop', "Density crop", density_crop, ['density_quantile'], ['poisson', 'sample'],
+          ['reconstruction'], lambda s: mesh_stats(s['reconstruction'])),
+    Stage('voxelize', "Voxelization", voxelize, ['voxel_divisor'], ['sample'], ['voxels', 'voxel_size'],
+          lambda s: {'voxels': len(s['voxels'].get_voxels()), 'voxel_size': s['voxel_size']}),
+    # clip_mode=poisson reconstructs again with poisson_depth and density_quantile
+    Stage('clip', "Surface clipping", clip,
+          ['clip_axis', 'clip_planes', 'clip_mode', 'poisson_depth', 'density_quantile'],
+          ['normals', 'density_crop'], ['clipped', 'clipped_mesh', 'clip_planes'],
+          lambda s: dict(mesh_stats(s['clipped_mesh']), points=len(s['clipped'].points))),
+    Stage('colorize', "Color and extremes", colorize, [], ['clip'], ['colored', 'z_min_point', 'z_max_point'],
+          lambda s: {'z_min_point': s['z_min_point'].tolist(), 'z_max_point': s['z_max_point'].tolist()}),
+]
+STAGE_NAMES = [stage.name for stage in STAGES]
+
+
+class PipelineState:
+    # Outputs by name; cached ones are read from their .npz file the first time they are used
+    def __init__(self, source, mesh_cache_dir=MESH_CACHE_DIR):
+        self.source = source
+        self.mesh_cache_dir = mesh_cache_dir
+        self.values = {}
+        self.files = {}
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            self.values.update(load_outputs(self.files[name]))
+        return self.values[name]
+
+    def __contains__(self, name):
+        return name in self.values or name in self.files
+
+
+def stage_key(stage, params, keys):
+    # keys: cache key of every earlier stage, plus 'source'
+    used = {name: params[name] for name in stage.params}
+    inputs = {name: keys[name] for name in stage.inputs}
+    payload = json.dumps([CACHE_VERSION, stage.name, used, inputs], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def resolve_params(params=None):
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    unknown = sorted(set(params) - set(DEFAULT_PARAMS))
+    if unknown:
+        raise ValueError(f"unknown parameters {unknown}, expected some of {sorted(DEFAULT_PARAMS)}")
+    return params
+
+
+def run_pipeline(source, params=None, cache_dir=CACHE_DIR, until=None, on_stage=None,
+                 mesh_cache_dir=MESH_CACHE_DIR):
+    # Runs the stages up to and including `until` (default: all). cache_dir=None disables the
+    # stage cache, mesh_cache_dir=None the binary model cache.
+    # on_stage(stage, state, timing) is called after every stage, e.g. to print or show it.
+    # Returns the state and one {'stage', 'seconds', 'cached'} dict per stage.
+    params = resolve_params(params)
+    state = PipelineState(source, mesh_cache_dir)
+    keys = {'source': source_hash(source, mesh_cache_dir)}
+    timings = []
+    for stage in STAGES:
+        key = keys[stage.name] = stage_key(stage, params, keys)
+        path = os.path.join(cache_dir, stage.name, f"{key}.npz") if cache_dir and stage.cache else None
+        start = time.perf_counter()
+        cached = path is not None and os.path.exists(path)
+        if cached:
+            state.files.update({name: path for name in stage.outputs})
+        else:
+            outputs = stage.func(state, params)
+            state.values.update(outputs)
+            if path is not None:
+                save_outputs(path, outputs)
+        timing = {'stage': stage.name, 'seconds': time.perf_counter() - start, 'cached': cached}
+        timings.append(timing)
+        if on_stage is not None:
+            on_stage(stage, state, timing)
+        if stage.name == until:
+            break
+    return state, timings
@@ -0,0 +1,52 @@
+from sqlalchemy import text
+
+from db import get_engine
+from id_allocator import ID_WIDTH, sync_all_sequences
+from schema import foreign_keys, key_columns
+
+# Rewrites short prefixed keys (A001, P34, ...) to the fixed-width format used by
+# id_allocator.py (A000000001, P000000034, ...) in every key column, then seeds the
+# id sequences. Runs in one transaction: foreign keys are dropped, all tables are
+# rewritten and the foreign keys are added back, so either everything changes or
+# nothing does. Safe to run more than once. Stop the generators first.
+
+engine = get_engine()
+
+SHORT_KEY = f"^[A-Z][0-9]{{1,{ID_WIDTH - 1}}}$"
+
+
+def padded(column):
+    return f"LEFT({column}, 1) || LPAD(SUBSTRING({column} FROM 2), {ID_WIDTH}, '0')"
+
+
+def migrate():
+    with engine.begin() as connection:
+        # Only the foreign keys that exist now are put back
+        existing = {(row[0], row[1]) for row in connection.execute(text(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE contype = 'f'"))}
+        restore = [fk for fk in foreign_keys if (fk[0], fk[1]) in existing]
+        for table_name, constraint, _, _, _ in restore:
+            connection.execute(text(f"ALTER TABLE {table_name} DROP CONSTRAINT {constraint}"))
+
+        for table_name, columns in key_columns.items():
+            assignments = ", ".join(
+                f"{c} = CASE WHEN {c} ~ '{SHORT_KEY}' THEN {padded(c)} ELSE {c} END" for c in columns)
+            condition = " OR ".join(f"{c} ~ '{SHORT_KEY}'" for c in columns)
+            result = connection.execute(text(f"UPDATE {table_name} SET {assignments} WHERE {condition}"))
+            print(f"Rewrote keys in {result.rowcount} rows of {table_name}")
+
+        for table_name, constraint, column, ref_table, ref_column in restore:
+            connection.execute(text(f"ALTER TABLE {table_name} ADD CONSTRAINT {constraint} "
+                                    f"FOREIGN KEY ({column}) REFERENCES {ref_table}({ref_column})"))
+        print(f"Restored {len(restore)} foreign keys")
+
+    raw = engine.raw_connection()
+    try:
+        sync_all_sequences(raw)
+    finally:
+        raw.close()
+    print("Id sequences seeded. Refresh the rollups (python rollups.py refresh) if you use them.")
+
+
+if __name__ == "__main__":
+    migrate()
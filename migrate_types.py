@@ -0,0 +1,57 @@
+from sqlalchemy import text
+
+from db import get_engine
+from schema import column_types
+
+# Converts a database loaded before column_types existed (dates/times stored as TEXT,
+# amounts as DOUBLE PRECISION) to native types in place. Safe to run more than once:
+# columns that already have the target type are left alone.
+# Run this before using the rewritten queries.sql / visual_query.sql, which compare
+# the date columns against DATE literals.
+
+engine = get_engine()
+
+
+def current_type(connection, table_name, column_name):
+    # Full type with its modifier, e.g. 'numeric(12,2)' or 'timestamp without time zone'
+    return connection.execute(text("""
+        SELECT format_type(a.atttypid, a.atttypmod) FROM pg_attribute a
+        WHERE a.attrelid = to_regclass(:t) AND a.attname = :c AND a.attnum > 0 AND NOT a.attisdropped
+    """), {"t": table_name, "c": column_name}).scalar()
+
+
+def normalize_type(type_name):
+    # format_type() spelling: lower case, no space after the commas of a modifier
+    return " ".join(type_name.lower().replace(", ", ",").split())
+
+
+def migrate():
+    for table_name, columns in column_types.items():
+        for column_name, col_type in columns.items():
+            target = col_type.compile(dialect=engine.dialect)
+            # engine.begin() gives every column its own transaction, so one bad value
+            # only blocks that column
+            try:
+                with engine.begin() as connection:
+                    existing = current_type(connection, table_name, column_name)
+                    if existing is None:
+                        print(f"Skipping {table_name}.{column_name}: column not found")
+                        continue
+                    if normalize_type(existing) == normalize_type(target):
+                        print(f"{table_name}.{column_name} is already {existing}")
+                        continue
+                    using = f"NULLIF(TRIM({column_name}::text), '')::{target}"
+                    connection.execute(text(
+                        f"ALTER TABLE {table_name} ALTER COLUMN {column_name} TYPE {target} USING {using}"))
+                    print(f"Converted {table_name}.{column_name}: {existing} -> {target}")
+            except Exception as e:
+                print(f"Error converting {table_name}.{column_name}: {e}")
+
+    with engine.begin() as connection:
+        for table_name in column_types:
+            connection.execute(text(f"ANALYZE {table_name}"))
+    print("Migration finished; statistics refreshed.")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -4,7 +4,7 @@ SELECT * FROM appointments LIMIT 10;
 -- Basic Query 2: Filter appointments in 2023 and sort by appointment_id
 SELECT appointment_id, patient_id, doctor_id, appointment_date
 FROM appointments
-WHERE appointment_date LIKE '2023%'
+WHERE appointment_date >= DATE '2023-01-01' AND appointment_date < DATE '2024-01-01'
 ORDER BY appointment_id;
 
 -- Basic Query 3: Aggregate billing data by payment status
@@ -28,16 +28,16 @@ SELECT p.patient_id, p.first_name, p.last_name, COUNT(a.appointment_id) as appoi
 FROM patients p
 LEFT JOIN appointments a ON p.patient_id = a.patient_id
 LEFT JOIN billing b ON p.patient_id = b.patient_id
-WHERE a.appointment_date LIKE '2023%' OR a.appointment_date IS NULL
+WHERE (a.appointment_date >= DATE '2023-01-01' AND a.appointment_date < DATE '2024-01-01') OR a.appointment_date IS NULL
 GROUP BY p.patient_id, p.first_name, p.last_name
 ORDER BY appointment_count DESC, total_billed DESC
 LIMIT 10;
 
 -- Analytical Query 2: Uncovers monthly patterns in 2023 for staffing optimization
-SELECT SUBSTRING(appointment_date FROM 6 FOR 2) as month, 
+SELECT TO_CHAR(appointment_date, 'MM') as month, 
        COUNT(appointment_id) as appointment_count
 FROM appointments
-WHERE appointment_date LIKE '2023%'
+WHERE appointment_date >= DATE '2023-01-01' AND appointment_date < DATE '2024-01-01'
 GROUP BY month
 ORDER BY month;
 
@@ -48,7 +48,7 @@ FROM doctors d
 LEFT JOIN appointments a ON d.doctor_id = a.doctor_id
 LEFT JOIN treatments t ON a.appointment_id = t.appointment_id
 LEFT JOIN billing b ON t.treatment_id = b.treatment_id
-WHERE a.appointment_date LIKE '2023%' OR a.appointment_date IS NULL
+WHERE (a.appointment_date >= DATE '2023-01-01' AND a.appointment_date < DATE '2024-01-01') OR a.appointment_date IS NULL
 GROUP BY d.doctor_id, d.first_name, d.last_name, d.specialization
 ORDER BY total_revenue DESC
 LIMIT 10;
@@ -59,25 +59,26 @@ SELECT b.payment_method,
        COUNT(b.bill_id) as bill_count, 
        AVG(b.amount) as avg_bill_amount
 FROM billing b
-WHERE b.payment_status = 'Paid' AND b.bill_date LIKE '2023%'
+WHERE b.payment_status = 'Paid' AND b.bill_date >= DATE '2023-01-01' AND b.bill_date < DATE '2024-01-01'
 GROUP BY b.payment_method
 ORDER BY total_revenue DESC;
 
 -- Analytical Query 5: Identifies busiest days of the week for appointments in 2023
-SELECT TO_CHAR(TO_DATE(a.appointment_date, 'YYYY-MM-DD'), 'Day') as day_of_week, 
+SELECT TO_CHAR(a.appointment_date, 'Day') as day_of_week, 
        COUNT(a.appointment_id) as appointment_count
 FROM appointments a
-WHERE a.appointment_date LIKE '2023%'
+WHERE a.appointment_date >= DATE '2023-01-01' AND a.appointment_date < DATE '2024-01-01'
 GROUP BY day_of_week
 ORDER BY appointment_count DESC;
 
 -- Analytical Query 6: Calculates average days between appointment and billing for paid bills in 2023
 SELECT t.treatment_type, 
-       AVG(TO_DATE(b.bill_date, 'YYYY-MM-DD') - TO_DATE(a.appointment_date, 'YYYY-MM-DD')) as avg_billing_lag_days
+       AVG(b.bill_date - a.appointment_date) as avg_billing_lag_days
 FROM treatments t
 JOIN appointments a ON t.appointment_id = a.appointment_id
 JOIN billing b ON t.treatment_id = b.treatment_id
-WHERE b.payment_status = 'Paid' AND b.bill_date LIKE '2023%' AND a.appointment_date LIKE '2023%'
+WHERE b.payment_status = 'Paid' AND b.bill_date >= DATE '2023-01-01' AND b.bill_date < DATE '2024-01-01'
+  AND a.appointment_date >= DATE '2023-01-01' AND a.appointment_date < DATE '2024-01-01'
 GROUP BY t.treatment_type
 HAVING COUNT(b.bill_id) >= 1
 ORDER BY avg_billing_lag_days DESC
@@ -89,7 +90,7 @@ SELECT d.doctor_id, d.first_name AS doctor_first_name, d.last_name AS doctor_las
 FROM doctors d
 JOIN appointments a ON d.doctor_id = a.doctor_id
 JOIN patients p ON a.patient_id = a.patient_id
-WHERE a.appointment_date LIKE '2023%'
+WHERE a.appointment_date >= DATE '2023-01-01' AND a.appointment_date < DATE '2024-01-01'
 GROUP BY d.doctor_id, d.first_name, d.last_name, p.patient_id, p.first_name, p.last_name
 ORDER BY appointment_count DESC
 LIMIT 10;
@@ -99,7 +100,7 @@ SELECT d.doctor_id, d.first_name, d.last_name, d.specialization,
        COUNT(a.appointment_id) as appointment_count
 FROM doctors d
 LEFT JOIN appointments a ON d.doctor_id = a.doctor_id
-WHERE a.appointment_date LIKE '2023%' OR a.appointment_date IS NULL
+WHERE (a.appointment_date >= DATE '2023-01-01' AND a.appointment_date < DATE '2024-01-01') OR a.appointment_date IS NULL
 GROUP BY d.doctor_id, d.first_name, d.last_name, d.specialization
 ORDER BY appointment_count DESC
 LIMIT 10;
@@ -110,7 +111,7 @@ SELECT t.treatment_type,
        COUNT(b.bill_id) as bill_count
 FROM treatments t
 JOIN billing b ON t.treatment_id = b.treatment_id
-WHERE b.bill_date LIKE '2023%'
+WHERE b.bill_date >= DATE '2023-01-01' AND b.bill_date < DATE '2024-01-01'
 GROUP BY t.treatment_type
 HAVING COUNT(b.bill_id) >= 1
 ORDER BY avg_treatment_cost DESC
@@ -122,7 +123,7 @@ WITH patient_appointments AS (
            COUNT(a.appointment_id) as appointment_count
     FROM patients p
     LEFT JOIN appointments a ON p.patient_id = a.patient_id
-    WHERE a.appointment_date LIKE '2023%' OR a.appointment_date IS NULL
+    WHERE (a.appointment_date >= DATE '2023-01-01' AND a.appointment_date < DATE '2024-01-01') OR a.appointment_date IS NULL
     GROUP BY p.patient_id
 )
 SELECT 
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+import psycopg2.extensions
+
+# Per-statement metrics fed by db.py's query hooks: a latency histogram, rows reported by
+# the server, rows and (estimated) bytes fetched, and errors. Statements are grouped by
+# fingerprint, i.e. the SQL with whitespace collapsed and literals replaced by '?'.
+#
+# Statements slower than slow_query_ms are appended to a JSONL slow-query log together
+# with their plain EXPLAIN plan. The plan comes from a separate connection, so the
+# statement is not run a second time and the caller's transaction is left alone.
+#
+# At exit the metrics are written as JSON (.json) or in the Prometheus text format
+# (anything else, e.g. .prom for node_exporter's textfile collector).
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+EXPLAINABLE = ('select', 'with', 'insert', 'update', 'delete', 'values', 'table')
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def fingerprint(sql):
+    return LITERALS.sub('?', ' '.join(sql.split()))
+
+
+def query_id(fp):
+    return hashlib.sha1(fp.encode('utf-8')).hexdigest()[:12]
+
+
+def new_stats(fp):
+    return {'query_id': query_id(fp), 'sql': fp, 'count': 0, 'errors': 0, 'seconds_sum': 0.0,
+            'seconds_max': 0.0, 'buckets': [0] * (len(BUCKETS) + 1), 'rows': 0,
+            'fetched_rows': 0, 'fetched_bytes': 0, 'fetch_seconds': 0.0, 'slow': 0}
+
+
+def label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+class QueryMetrics:
+    def __init__(self, metrics_file='', slow_query_ms=0, slow_query_log='', connect=None):
+        self.metrics_file = metrics_file
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_log = slow_query_log
+        self.connect = connect
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.explain_lock = threading.Lock()
+        self.explain_conn = None
+        # Worker processes re-import db.py; only the process that started the run writes the file
+        self.pid = os.getpid()
+
+    def __call__(self, event):
+        fp = fingerprint(event['sql'] or '')
+        seconds = event['seconds']
+        with self.lock:
+            stats = self.stats.get(fp)
+            if stats is None:
+                stats = self.stats[fp] = new_stats(fp)
+            if event['kind'] == 'fetch':
+                stats['fetched_rows'] += event['rows']
+                stats['fetched_bytes'] += event['bytes']
+                stats['fetch_seconds'] += seconds
+                return
+            stats['count'] += 1
+            stats['seconds_sum'] += seconds
+            stats['seconds_max'] = max(stats['seconds_max'], seconds)
+            stats['buckets'][next((i for i, b in enumerate(BUCKETS) if seconds <= b), len(BUCKETS))] += 1
+            if event['error'] is not None:
+                stats['errors'] += 1
+            elif event['rows'] > 0:
+                stats['rows'] += event['rows']
+            slow = (self.slow_query_ms and event['error'] is None
+                    and seconds * 1000 >= self.slow_query_ms)
+            if slow:
+                stats['slow'] += 1
+        if slow:
+            self.log_slow(event, stats)
+
+    def log_slow(self, event, stats):
+        statement = event['sql']
+        if event['params'] is not None:
+            try:
+                statement = event['cursor'].mogrify(event['sql'], event['params']).decode('utf-8', 'replace')
+            except Exception:
+                pass
+        plan = None
+        if event['kind'] == 'execute' and statement.lstrip().lower().startswith(EXPLAINABLE):
+            plan = self.explain(statement)
+        record = {'at': datetime.now().isoformat(timespec='seconds'), 'ms': round(event['seconds'] * 1000, 1),
+                  'rows': event['rows'], 'query_id': stats['query_id'], 'sql': statement, 'plan': plan}
+        os.makedirs(os.path.dirname(self.slow_query_log) or '.', exist_ok=True)
+        with self.lock, open(self.slow_query_log, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+    def explain(self, statement):
+        with self.explain_lock:
+            try:
+                if self.explain_conn is None or self.explain_conn.closed:
+                    self.explain_conn = self.connect(application_name='hospital-analytics-explain')
+                    self.explain_conn.autocommit = True
+                # Plain cursor: the EXPLAIN itself is not measured
+                with self.explain_conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                    cur.execute("EXPLAIN (FORMAT JSON) " + statement)
+                    return cur.fetchone()[0]
+            except Exception as e:
+                return {'error': str(e).strip()}
+
+    def snapshot(self):
+        with self.lock:
+            return [dict(s, buckets=list(s['buckets'])) for s in self.stats.values()]
+
+    def to_json(self):
+        return {'written_at': datetime.now().isoformat(timespec='seconds'), 'pid': self.pid,
+                'buckets': list(BUCKETS), 'queries': sorted(self.snapshot(), key=lambda s: -s['seconds_sum'])}
+
+    def to_prometheus(self):
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        stats = self.snapshot()
+        metric('hospital_query_duration_seconds', 'histogram', 'Statement latency')
+        for s in stats:
+            qid = s['query_id']
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), s['buckets']):
+                cumulative += count
+                lines.append(f'hospital_query_duration_seconds_bucket{{query_id="{qid}",le="{bound}"}} {cumulative}')
+            lines.append(f'hospital_query_duration_seconds_sum{{query_id="{qid}"}} {s["seconds_sum"]:.6f}')
+            lines.append(f'hospital_query_duration_seconds_count{{query_id="{qid}"}} {s["count"]}')
+        for name, key, help_text in [
+            ('hospital_query_rows_total', 'rows', 'Rows returned or affected, as reported by the server'),
+            ('hospital_query_fetched_rows_total', 'fetched_rows', 'Rows fetched by the client'),
+            ('hospital_query_fetched_bytes_total', 'fetched_bytes', 'Estimated bytes fetched by the client'),
+            ('hospital_query_errors_total', 'errors', 'Statements that raised an error'),
+            ('hospital_query_slow_total', 'slow', 'Statements above the slow-query threshold'),
+        ]:
+            metric(name, 'counter', help_text)
+            for s in stats:
+                lines.append(f'{name}{{query_id="{s["query_id"]}"}} {s[key]}')
+        metric('hospital_query_info', 'gauge', 'Normalized SQL per query_id')
+        for s in stats:
+            lines.append(f'hospital_query_info{{query_id="{s["query_id"]}",sql="{label(s["sql"][:300])}"}} 1')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.lower().endswith('.json'):
+                json.dump(self.to_json(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+    def close(self):
+        if self.explain_conn is not None and not self.explain_conn.closed:
+            self.explain_conn.close()
+        if not self.metrics_file or os.getpid() != self.pid or not self.stats:
+            return
+        self.write(self.metrics_file)
+        print(f"Query metrics for {len(self.stats)} statements written to {self.metrics_file}")
@@ -0,0 +1,41 @@
+from dataclasses import asdict
+
+from chart_specs import HEADER_RE, parse_chart_specs
+
+# Reads the two query pack formats used in this repo:
+#   queries.sql       - statements separated by ';', each preceded by a "-- Description" comment
+#   visual_query.sql  - "-- name:" blocks with "-- key: value" headers followed by the SQL,
+#                       parsed by chart_specs.parse_chart_specs
+# Returns a list of dicts with at least "name" and "sql".
+
+
+def read_queries(path):
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    headers = (HEADER_RE.match(line.strip()) for line in content.splitlines())
+    if any(header and header.group(1) == "name" for header in headers):
+        return _read_named_blocks(content, path)
+    return _read_statements(content)
+
+
+def _read_statements(content):
+    queries = []
+    for statement in content.split(";"):
+        comment_lines = []
+        sql_lines = []
+        for line in statement.strip().splitlines():
+            if line.strip().startswith("--") and not sql_lines:
+                comment_lines.append(line.strip()[2:].strip())
+            else:
+                sql_lines.append(line)
+        sql = "\n".join(sql_lines).strip()
+        if not sql:
+            continue
+        name = comment_lines[0] if comment_lines else f"Query {len(queries) + 1}"
+        queries.append({"name": name, "sql": sql})
+    return queries
+
+
+def _read_named_blocks(content, path):
+    # Same parser (and checks) as the chart pipeline, so both read the file identically
+    return [asdict(spec) for spec in parse_chart_specs(content, path)]
@@ -0,0 +1,40 @@
+-- Rollup Query 1: Monthly appointment counts in 2023 (reads mv_appointments_monthly)
+SELECT TO_CHAR(month, 'MM') as month,
+       appointment_count
+FROM mv_appointments_monthly
+WHERE month >= DATE '2023-01-01' AND month < DATE '2024-01-01'
+ORDER BY month;
+
+-- Rollup Query 2: Top 10 doctors by 2023 revenue (reads mv_doctor_revenue)
+SELECT doctor_id, doctor_name, specialization,
+       SUM(total_revenue) as total_revenue
+FROM mv_doctor_revenue
+WHERE (month >= DATE '2023-01-01' AND month < DATE '2024-01-01') OR month IS NULL
+GROUP BY doctor_id, doctor_name, specialization
+ORDER BY total_revenue DESC
+LIMIT 10;
+
+-- Rollup Query 3: Popular payment methods for paid bills in 2023 (reads mv_payment_method_totals)
+SELECT payment_method,
+       SUM(total_amount) as total_revenue,
+       SUM(bill_count) as bill_count,
+       SUM(total_amount) / NULLIF(SUM(bill_count), 0) as avg_bill_amount
+FROM mv_payment_method_totals
+WHERE payment_status = 'Paid' AND month >= DATE '2023-01-01' AND month < DATE '2024-01-01'
+GROUP BY payment_method
+ORDER BY total_revenue DESC;
+
+-- Rollup Query 4: Billing by payment status (reads mv_payment_method_totals)
+SELECT payment_status,
+       SUM(bill_count) as bill_count,
+       SUM(total_amount) / NULLIF(SUM(bill_count), 0) as avg_amount,
+       MIN(min_amount) as min_amount,
+       MAX(max_amount) as max_amount
+FROM mv_payment_method_totals
+GROUP BY payment_status;
+
+-- Rollup Query 5: VIP patients by appointment count and total billing (reads mv_patient_engagement)
+SELECT patient_id, first_name, last_name, appointment_count, total_billed
+FROM mv_patient_engagement
+ORDER BY appointment_count DESC, total_billed DESC
+LIMIT 10;
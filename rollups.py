@@ -0,0 +1,324 @@
+import argparse
+import os
+import select
+import time
+import uuid
+
+import yaml
+from sqlalchemy import text
+
+from db import DB_HOST, DB_PORT, DB_NAME, DB_USER, get_engine
+
+engine = get_engine()
+
+# Pre-aggregated materialized views for the dashboards and query packs.
+# Each rollup has a unique index so it can be refreshed CONCURRENTLY: readers keep
+# seeing the previous contents while the refresh runs.
+ROLLUPS = {
+    "mv_appointments_daily": {
+        "sql": """
+            SELECT appointment_date AS day,
+                   COALESCE(status, 'Unknown') AS status,
+                   COUNT(*) AS appointment_count
+            FROM appointments
+            GROUP BY appointment_date, COALESCE(status, 'Unknown')
+        """,
+        "key": ["day", "status"],
+        "dttm": "day",
+        "columns": {"day": "DATE", "status": "TEXT", "appointment_count": "BIGINT"},
+        "sources": ["appointments"],
+    },
+    "mv_appointments_monthly": {
+        "sql": """
+            SELECT date_trunc('month', appointment_date)::date AS month,
+                   COUNT(*) AS appointment_count,
+                   COUNT(DISTINCT patient_id) AS patient_count
+            FROM appointments
+            GROUP BY 1
+        """,
+        "key": ["month"],
+        "dttm": "month",
+        "columns": {"month": "DATE", "appointment_count": "BIGINT", "patient_count": "BIGINT"},
+        "sources": ["appointments"],
+    },
+    "mv_doctor_revenue": {
+        "sql": """
+            SELECT d.doctor_id,
+                   d.first_name || ' ' || d.last_name AS doctor_name,
+                   d.specialization,
+                   date_trunc('month', a.appointment_date)::date AS month,
+                   COUNT(DISTINCT a.appointment_id) AS appointment_count,
+                   COALESCE(SUM(b.amount), 0) AS total_revenue
+            FROM doctors d
+            LEFT JOIN appointments a ON d.doctor_id = a.doctor_id
+            LEFT JOIN treatments t ON a.appointment_id = t.appointment_id
+            LEFT JOIN billing b ON t.treatment_id = b.treatment_id
+            GROUP BY d.doctor_id, d.first_name, d.last_name, d.specialization, 4
+        """,
+        "key": ["doctor_id", "month"],
+        "dttm": "month",
+        "columns": {"doctor_id": "TEXT", "doctor_name": "TEXT", "specialization": "TEXT", "month": "DATE",
+                    "appointment_count": "BIGINT", "total_revenue": "NUMERIC"},
+        "sources": ["doctors", "appointments", "treatments", "billing"],
+    },
+    "mv_payment_method_totals": {
+        "sql": """
+            SELECT date_trunc('month', bill_date)::date AS month,
+                   payment_method,
+                   payment_status,
+                   COUNT(*) AS bill_count,
+                   SUM(amount) AS total_amount,
+                   MIN(amount) AS min_amount,
+                   MAX(amount) AS max_amount
+            FROM billing
+            GROUP BY 1, payment_method, payment_status
+        """,
+        "key": ["month", "payment_method", "payment_status"],
+        "dttm": "month",
+        "columns": {"month": "DATE", "payment_method": "TEXT", "payment_status": "TEXT", "bill_count": "BIGINT",
+                    "total_amount": "NUMERIC", "min_amount": "NUMERIC", "max_amount": "NUMERIC"},
+        "sources": ["billing"],
+    },
+    "mv_patient_engagement": {
+        # Appointments and bills are aggregated separately before the join, so a patient
+        # with many bills does not multiply their appointment count
+        "sql": """
+            SELECT p.patient_id,
+                   p.first_name,
+                   p.last_name,
+                   COALESCE(a.appointment_count, 0) AS appointment_count,
+                   a.first_appointment,
+                   a.last_appointment,
+                   COALESCE(b.total_billed, 0) AS total_billed
+            FROM patients p
+            LEFT JOIN (
+                SELECT patient_id, COUNT(*) AS appointment_count,
+                       MIN(appointment_date) AS first_appointment,
+                       MAX(appointment_date) AS last_appointment
+                FROM appointments GROUP BY patient_id
+            ) a ON a.patient_id = p.patient_id
+            LEFT JOIN (
+                SELECT patient_id, SUM(amount) AS total_billed
+                FROM billing GROUP BY patient_id
+            ) b ON b.patient_id = p.patient_id
+        """,
+        "key": ["patient_id"],
+        "dttm": "last_appointment",
+        "columns": {"patient_id": "TEXT", "first_name": "TEXT", "last_name": "TEXT", "appointment_count": "BIGINT",
+                    "first_appointment": "DATE", "last_appointment": "DATE", "total_billed": "NUMERIC"},
+        "sources": ["patients", "appointments", "billing"],
+    },
+}
+
+NOTIFY_CHANNEL = "rollup_refresh"
+DATASET_DIR = "dashboard_rollups"
+# Same database entry as the exported dashboards, so the datasets import next to them
+DATABASE_UUID = "ac0f538b-a2d9-46ee-a81b-2d655da6d00e"
+
+
+def create_rollups():
+    with engine.begin() as connection:
+        for name, rollup in ROLLUPS.items():
+            connection.execute(text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {rollup['sql']}"))
+            connection.execute(text(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {name}_key ON {name} ({', '.join(rollup['key'])})"))
+            print(f"Created {name}")
+
+
+def drop_rollups():
+    with engine.begin() as connection:
+        for name in ROLLUPS:
+            connection.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {name}"))
+            print(f"Dropped {name}")
+
+
+def refresh_rollups(names=None):
+    # CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for name in names or ROLLUPS:
+            start = time.perf_counter()
+            try:
+                connection.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}"))
+                print(f"Refreshed {name} in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                print(f"Error refreshing {name}: {e}")
+
+
+def rollups_for_tables(tables):
+    return [name for name, rollup in ROLLUPS.items() if set(rollup["sources"]) & set(tables)]
+
+
+def install_triggers():
+    # Statement-level triggers only send a NOTIFY; the refresh itself runs in `listen`,
+    # so inserts from the generators never wait on an aggregate rebuild
+    tables = sorted({t for rollup in ROLLUPS.values() for t in rollup["sources"]})
+    with engine.begin() as connection:
+        connection.execute(text(f"""
+            CREATE OR REPLACE FUNCTION notify_rollup_refresh() RETURNS trigger AS $$
+            BEGIN
+                PERFORM pg_notify('{NOTIFY_CHANNEL}', TG_TABLE_NAME);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+        for table in tables:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {table}_rollup_notify ON {table}"))
+            connection.execute(text(f"""
+                CREATE TRIGGER {table}_rollup_notify
+                AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+                FOR EACH STATEMENT EXECUTE FUNCTION notify_rollup_refresh()
+            """))
+            print(f"Installed refresh trigger on {table}")
+
+
+def listen(debounce=5.0):
+    # Collects notifications for `debounce` seconds, then refreshes only the rollups
+    # built from the tables that changed
+    raw = engine.raw_connection()
+    raw.set_isolation_level(0)
+    cur = raw.cursor()
+    cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+    print(f"Listening on '{NOTIFY_CHANNEL}'. Stop with Ctrl+C.")
+    dirty = set()
+    deadline = None
+    try:
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if deadline else 60.0
+            if select.select([raw.connection], [], [], timeout) != ([], [], []):
+                raw.connection.poll()
+                while raw.connection.notifies:
+                    dirty.add(raw.connection.notifies.pop(0).payload)
+                if dirty and deadline is None:
+                    deadline = time.monotonic() + debounce
+            if deadline and time.monotonic() >= deadline:
+                print(f"Changes in {sorted(dirty)}")
+                refresh_rollups(rollups_for_tables(dirty))
+                dirty.clear()
+                deadline = None
+    except KeyboardInterrupt:
+        print("Listener stopped.")
+    finally:
+        cur.close()
+        raw.close()
+
+
+def dataset_yaml(name, rollup):
+    description = rollup.get("description") or (
+        f"Materialized rollup maintained by rollups.py (sources: {', '.join(rollup['sources'])})")
+    columns = []
+    for column_name, col_type in rollup["columns"].items():
+        columns.append({
+            "column_name": column_name,
+            "verbose_name": None,
+            "is_dttm": col_type == "DATE",
+            "is_active": True,
+            "type": col_type,
+            "advanced_data_type": None,
+            "groupby": True,
+            "filterable": True,
+            "expression": None,
+            "description": None,
+            "python_date_format": None,
+            "extra": None,
+        })
+    return {
+        "table_name": name,
+        "main_dttm_col": rollup["dttm"],
+        "description": description,
+        "default_endpoint": None,
+        "offset": 0,
+        "cache_timeout": None,
+        "catalog": None,
+        "schema": "public",
+        "sql": None,
+        "params": None,
+        "template_params": None,
+        "filter_select_enabled": True,
+        "fetch_values_predicate": None,
+        "extra": None,
+        "normalize_columns": False,
+        "always_filter_main_dttm": False,
+        # Stable uuid, so re-importing updates the dataset instead of duplicating it
+        "uuid": str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{DB_NAME}.public.{name}")),
+        "metrics": [{
+            "metric_name": "count",
+            "verbose_name": "COUNT(*)",
+            "metric_type": "count",
+            "expression": "COUNT(*)",
+            "description": None,
+            "d3format": None,
+            "currency": None,
+            "extra": None,
+            "warning_text": None,
+        }],
+        "columns": columns,
+        "version": "1.0.0",
+        "database_uuid": DATABASE_UUID,
+    }
+
+
+def write_datasets(out_dir=DATASET_DIR, datasets=None):
+    datasets = datasets or ROLLUPS
+    dataset_dir = os.path.join(out_dir, "datasets", "Hospital")
+    database_dir = os.path.join(out_dir, "databases")
+    os.makedirs(dataset_dir, exist_ok=True)
+    os.makedirs(database_dir, exist_ok=True)
+
+    def dump(path, data):
+        with open(path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(data, f, sort_keys=False, allow_unicode=True)
+
+    for name, rollup in datasets.items():
+        dump(os.path.join(dataset_dir, f"{name}.yaml"), dataset_yaml(name, rollup))
+    dump(os.path.join(database_dir, "Hospital.yaml"), {
+        "database_name": "Hospital",
+        "sqlalchemy_uri": f"postgresql://{DB_USER}:XXXXXXXXXX@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+        "cache_timeout": None,
+        "expose_in_sqllab": True,
+        "allow_run_async": False,
+        "allow_ctas": False,
+        "allow_cvas": False,
+        "allow_dml": False,
+        "allow_file_upload": True,
+        "extra": {"metadata_params": {}, "engine_params": {}, "metadata_cache_timeout": {},
+                  "schemas_allowed_for_file_upload": []},
+        "impersonate_user": False,
+        "uuid": DATABASE_UUID,
+        "version": "1.0.0",
+    })
+    dump(os.path.join(out_dir, "metadata.yaml"), {
+        "version": "1.0.0",
+        "type": "SqlaTable",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime()),
+    })
+    print(f"Wrote {len(datasets)} Superset datasets to {dataset_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage materialized rollups for the dashboards")
+    parser.add_argument("command", choices=["create", "refresh", "drop", "triggers", "listen", "datasets"])
+    parser.add_argument("--every", type=float, default=0,
+                        help="with refresh: repeat every N seconds until Ctrl+C")
+    parser.add_argument("--debounce", type=float, default=5.0,
+                        help="with listen: seconds to batch change notifications before refreshing")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        create_rollups()
+    elif args.command == "drop":
+        drop_rollups()
+    elif args.command == "triggers":
+        install_triggers()
+    elif args.command == "listen":
+        listen(args.debounce)
+    elif args.command == "datasets":
+        write_datasets()
+    elif args.every > 0:
+        try:
+            while True:
+                refresh_rollups()
+                time.sleep(args.every)
+        except KeyboardInterrupt:
+            print("Refresh loop stopped.")
+    else:
+        refresh_rollups()
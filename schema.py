@@ -0,0 +1,37 @@
+from sqlalchemy.types import Date, Numeric, Time
+
+# Table layout of hospital_db shared by the loader and the maintenance scripts
+# (migrate_ids.py, migrate_types.py, index_advisor.py). Keeping it here lets them
+# import the keys without importing load_to_postgres and its CSV paths.
+
+# Primary key column per table
+primary_keys = {
+    'patients': 'patient_id',
+    'doctors': 'doctor_id',
+    'appointments': 'appointment_id',
+    'treatments': 'treatment_id',
+    'billing': 'bill_id'
+}
+
+# (table, constraint name, column, referenced table, referenced column)
+foreign_keys = [
+    ('appointments', 'fk_patient', 'patient_id', 'patients', 'patient_id'),
+    ('appointments', 'fk_doctor', 'doctor_id', 'doctors', 'doctor_id'),
+    ('treatments', 'fk_appointment', 'appointment_id', 'appointments', 'appointment_id'),
+    ('billing', 'fk_patient', 'patient_id', 'patients', 'patient_id'),
+    ('billing', 'fk_treatment', 'treatment_id', 'treatments', 'treatment_id')
+]
+
+# Every key column per table, primary and foreign
+key_columns = {
+    table_name: [pk] + [fk[2] for fk in foreign_keys if fk[0] == table_name]
+    for table_name, pk in primary_keys.items()
+}
+
+# Explicit column types; everything else keeps the type pandas infers.
+# Native DATE/TIME/NUMERIC lets range predicates and indexes work instead of LIKE '2023%' on text.
+column_types = {
+    'appointments': {'appointment_date': Date(), 'appointment_time': Time()},
+    'treatments': {'treatment_date': Date(), 'cost': Numeric(12, 2)},
+    'billing': {'bill_date': Date(), 'amount': Numeric(12, 2)}
+}
@@ -0,0 +1,39 @@
+import json
+import os
+
+import pytest
+
+try:
+    import open3d  # noqa: F401
+except ImportError as e:
+    # Also when open3d is installed but one of its shared libraries is missing
+    pytest.skip(f"open3d cannot be imported: {e}", allow_module_level=True)
+
+from mesh_batch import run_batch  # noqa: E402
+
+
+def crashing_worker(path, params, cache_dir, mesh_cache_dir):
+    # Stands in for process_model: m3 takes its worker process down, like the OOM killer would
+    if os.path.basename(path) == "m3.obj":
+        os._exit(1)
+    return {'model': path, 'size': 0, 'mtime_ns': 0, 'params_key': 'test', 'status': 'ok', 'error': None,
+            'stages': {}}
+
+
+def test_dead_worker_loses_no_models(tmp_path):
+    models = []
+    for i in range(1, 7):
+        path = tmp_path / f"m{i}.obj"
+        path.write_text("")
+        models.append(str(path))
+    report = tmp_path / "report.jsonl"
+
+    counts = run_batch(models, {}, str(report), workers=2, max_memory_bytes=0, worker=crashing_worker)
+
+    records = [json.loads(line) for line in report.read_text().splitlines()]
+    status = {os.path.basename(r['model']): r['status'] for r in records}
+    assert counts == {'ok': 5, 'failed': 1}
+    assert len(records) == 6
+    assert status == {'m1.obj': 'ok', 'm2.obj': 'ok', 'm3.obj': 'failed', 'm4.obj': 'ok', 'm5.obj': 'ok',
+                      'm6.obj': 'ok'}
+    assert next(r for r in records if r['model'].endswith('m3.obj'))['error'] == 'worker process died'
@@ -7,7 +7,8 @@ SELECT b.payment_method, SUM(b.amount) as total_revenue
 FROM billing b 
 JOIN treatments t ON b.treatment_id = t.treatment_id 
 JOIN appointments a ON t.appointment_id = a.appointment_id 
-WHERE b.payment_status = 'Paid' AND b.bill_date LIKE '2023%%' AND a.appointment_date LIKE '2023%%' 
+WHERE b.payment_status = 'Paid' AND b.bill_date >= DATE '2023-01-01' AND b.bill_date < DATE '2024-01-01'
+  AND a.appointment_date >= DATE '2023-01-01' AND a.appointment_date < DATE '2024-01-01' 
 GROUP BY b.payment_method 
 ORDER BY total_revenue DESC;
 
@@ -21,7 +22,7 @@ FROM doctors d
 LEFT JOIN appointments a ON d.doctor_id = a.doctor_id 
 LEFT JOIN treatments t ON a.appointment_id = t.appointment_id 
 LEFT JOIN billing b ON t.treatment_id = b.treatment_id 
-WHERE a.appointment_date LIKE '2023%%' OR a.appointment_date IS NULL 
+WHERE (a.appointment_date >= DATE '2023-01-01' AND a.appointment_date < DATE '2024-01-01') OR a.appointment_date IS NULL 
 GROUP BY d.doctor_id, d.first_name, d.last_name 
 ORDER BY total_revenue DESC 
 LIMIT 10;
@@ -35,7 +36,8 @@ SELECT t.treatment_type, AVG(b.amount) as avg_cost
 FROM treatments t 
 JOIN billing b ON t.treatment_id = b.treatment_id 
 JOIN appointments a ON t.appointment_id = a.appointment_id 
-WHERE b.bill_date LIKE '2023%%' AND a.appointment_date LIKE '2023%%' 
+WHERE b.bill_date >= DATE '2023-01-01' AND b.bill_date < DATE '2024-01-01'
+  AND a.appointment_date >= DATE '2023-01-01' AND a.appointment_date < DATE '2024-01-01' 
 GROUP BY t.treatment_type 
 ORDER BY avg_cost DESC 
 LIMIT 5;
@@ -45,11 +47,11 @@ LIMIT 5;
 -- title: Monthly Appointment Counts in 2023
 -- xlabel: Month
 -- ylabel: Appointment Count
-SELECT SUBSTRING(a.appointment_date FROM 6 FOR 2) as month, COUNT(a.appointment_id) as count 
+SELECT TO_CHAR(a.appointment_date, 'MM') as month, COUNT(a.appointment_id) as count 
 FROM appointments a 
 JOIN doctors d ON a.doctor_id = d.doctor_id 
 JOIN patients p ON a.patient_id = p.patient_id 
-WHERE a.appointment_date LIKE '2023%%' 
+WHERE a.appointment_date >= DATE '2023-01-01' AND a.appointment_date < DATE '2024-01-01' 
 GROUP BY month 
 ORDER BY month;
 
@@ -62,7 +64,8 @@ SELECT b.amount
 FROM billing b 
 JOIN treatments t ON b.treatment_id = t.treatment_id 
 JOIN appointments a ON t.appointment_id = a.appointment_id 
-WHERE b.bill_date LIKE '2023%%' AND a.appointment_date LIKE '2023%%';
+WHERE b.bill_date >= DATE '2023-01-01' AND b.bill_date < DATE '2024-01-01'
+  AND a.appointment_date >= DATE '2023-01-01' AND a.appointment_date < DATE '2024-01-01';
 
 -- name: scatter_patient_engagement
 -- type: scatter
@@ -74,5 +77,5 @@ FROM patients p
 LEFT JOIN appointments a ON p.patient_id = a.patient_id 
 LEFT JOIN treatments t ON a.appointment_id = t.appointment_id 
 LEFT JOIN billing b ON t.treatment_id = b.treatment_id 
-WHERE a.appointment_date LIKE '2023%%' OR a.appointment_date IS NULL 
+WHERE (a.appointment_date >= DATE '2023-01-01' AND a.appointment_date < DATE '2024-01-01') OR a.appointment_date IS NULL 
 GROUP BY p.patient_id;
\ No newline at end of file